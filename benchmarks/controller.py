@@ -0,0 +1,80 @@
+"""Measures per-waypoint serial overhead of controller moves, streaming and jogs against the Grbl simulator.
+
+Overhead is wall time less the time the simulated stage spent in motion.
+
+Usage:
+    python benchmarks/controller.py --waypoints 200
+"""
+import argparse
+import logging
+import sys
+from os.path import abspath, dirname
+from time import time
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from depthid.controllers import Grbl  # noqa: E402
+from depthid.controllers.simulator import Simulator  # noqa: E402
+from depthid.sequence import Sequence  # noqa: E402
+
+
+logging.basicConfig(format="%(asctime)s [%(levelname)-5.5s] %(message)s")
+logger = logging.getLogger("depthid")
+logger.setLevel(logging.INFO)
+
+
+def measure(simulator, label, n, fn):
+    motion_time = simulator.motion_time
+    start = time()
+    fn()
+    elapsed = time() - start
+    motion_time = simulator.motion_time - motion_time
+    logger.info(
+        f"{label:<8} {n} waypoints, {elapsed:.3f}s wall, {motion_time:.3f}s motion, "
+        f"{(elapsed - motion_time) / n * 1000:.1f}ms overhead/waypoint"
+    )
+
+
+def main(waypoints: int, status_interval: float, dwell: float, max_rate: float, acceleration: float):
+    settings = {}
+    settings.update({110 + idx: max_rate for idx in range(3)})
+    settings.update({120 + idx: acceleration for idx in range(3)})
+
+    with Simulator(settings=settings) as simulator:
+        controller = Grbl(simulator.device_name, 115200, [("x", .5), ("y", .5), ("z", .5)], status_interval)
+        controller.initialize()
+
+        sequence = Sequence.generate(f"x(0,{waypoints - 1},1)")
+        moves = [{axis: f"{pos:.3f}" for axis, pos in waypoint} for waypoint in sequence]
+
+        def move():
+            for waypoint in moves:
+                controller.move(waypoint)
+
+        def stream():
+            for _ in controller.stream(reversed(moves), dwell=dwell):
+                pass
+
+        def jog():
+            for _ in moves:
+                controller.jog("y", 1)
+
+        try:
+            measure(simulator, "move", len(moves), move)
+            measure(simulator, "stream", len(moves), stream)
+            measure(simulator, "jog", len(moves), jog)
+        finally:
+            controller.shutdown()
+
+        logger.info(f"{simulator.overflows} RX buffer overflows")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python benchmarks/controller.py")
+    parser.add_argument('--waypoints', type=int, default=100)
+    parser.add_argument('--status-interval', type=float, default=.1)
+    parser.add_argument('--dwell', type=float, default=0.0)
+    parser.add_argument('--max-rate', type=float, default=8000.0, help='$110-$112, mm/min')
+    parser.add_argument('--acceleration', type=float, default=200.0, help='$120-$122, mm/sec^2')
+    args = parser.parse_args()
+    main(**vars(args))
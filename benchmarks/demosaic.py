@@ -0,0 +1,70 @@
+"""Measures demosaic time per frame for each algorithm and tile count, and for Spinnaker's HQ_LINEAR converter.
+
+Frames are Bayer RG mosaics of a synthetic scene. Spinnaker is measured only where PySpin is installed.
+
+Usage:
+    python benchmarks/demosaic.py --width 1920 --height 1200 --bits 16
+"""
+import argparse
+import logging
+import os
+import sys
+from os.path import abspath, dirname
+from time import time
+
+import numpy as np
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+from depthid.cameras import Synthetic  # noqa: E402
+from depthid.pipeline.opencv import demosaic, halos  # noqa: E402
+
+
+logging.basicConfig(format="%(asctime)s [%(levelname)-5.5s] %(message)s")
+logger = logging.getLogger("depthid")
+logger.setLevel(logging.INFO)
+
+
+def measure(label, frames, fn):
+    fn()
+    start = time()
+    for _ in range(frames):
+        fn()
+    logger.info(f"{label:<24} {(time() - start) / frames * 1000:.1f}ms/frame")
+
+
+def main(width: int, height: int, bits: int, frames: int, workers: int):
+    camera = Synthetic(0, height, width, 1000, 0, f"Bayer RG {bits}", frame_rate=0)
+    camera.initialize()
+    raw = camera.capture().GetNDArray()
+    camera.shutdown()
+    out = np.empty((height, width, 3), dtype=raw.dtype)
+    logger.info(f"{width}x{height} Bayer RG {bits}, {frames} frames, {workers or os.cpu_count()} workers")
+
+    for algorithm in halos:
+        for tiles in sorted({1, 2, 4, workers or os.cpu_count()}):
+            measure(
+                f"{algorithm} {tiles} tiles", frames,
+                lambda: demosaic(raw, "RG", algorithm, tiles=tiles, workers=workers, out=out)
+            )
+
+    try:
+        import PySpin
+    except ImportError:
+        logger.info("PySpin unavailable, Spinnaker HQ_LINEAR not measured")
+        return
+
+    image = PySpin.Image.Create(width, height, 0, 0, getattr(PySpin, f"PixelFormat_BayerRG{bits}"), raw)
+    output_format = getattr(PySpin, f"PixelFormat_BGR{bits}")
+    measure("spinnaker HQ_LINEAR", frames, lambda: image.Convert(output_format, PySpin.HQ_LINEAR))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python benchmarks/demosaic.py")
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1200)
+    parser.add_argument('--bits', type=int, choices=(8, 16), default=16)
+    parser.add_argument('--frames', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    main(**vars(args))
@@ -1,11 +1,23 @@
 from .camera import Camera
 from .exception import CameraException
 from .opencv import OpenCV
-from .spinnaker import Spinnaker
+from .ring import Frame, FrameRing
+from .synthetic import Synthetic, SyntheticImage
+
+try:
+    from .spinnaker import Spinnaker
+except ImportError:
+    # PySpin is optional, e.g. when running headless with synthetic cameras
+    Spinnaker = None
 
 
 def load_camera(**kwargs):
-    return {
+    camera = {
         'spinnaker': Spinnaker,
-        'opencv': OpenCV
-    }[kwargs.pop('interface')](**kwargs)
\ No newline at end of file
+        'opencv': OpenCV,
+        'synthetic': Synthetic
+    }[kwargs.pop('interface')]
+
+    if camera is None:
+        raise CameraException("Spinnaker cameras require PySpin, which could not be imported")
+    return camera(**kwargs)
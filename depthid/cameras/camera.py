@@ -1,15 +1,35 @@
+import logging
+from queue import Empty, Full, Queue
+from threading import Event, Thread
+from time import time
+
+from .exception import CameraException
+from .ring import Frame
+
+
+logger = logging.getLogger("depthid")
+
+
 class Camera:
 
     features = {}
     settings = {}
+    policies = ("every", "newest")
+    profiles = ("capture", "preview")
+    profile_keys = ("binning", "decimation", "roi")
 
     def __init__(self, camera_index: int, height: int, width: int, exposure_us: float, gain_db: float,
-                 pixel_format: str, enabled: bool = True):
+                 pixel_format: str, enabled: bool = True, threaded: bool = False, queue_size: int = 4,
+                 preview: dict = None):
         """
         Arguments:
             camera_index (int): Index of camera, typically 0 to use default camera.
             height (int): Set vertical size of image, in pixels.
             width (int): Set horizontal size of image, in pixels.
+            threaded (bool): Acquire frames continuously on a background thread into a bounded queue.
+            queue_size (int): Number of acquired frames which may await capture, when threaded.
+            preview (dict): Reduced resolution profile for live view, any of binning (int), decimation (int)
+                and roi ([offset_x, offset_y, width, height]), e.g. {"binning": 2}.
         """
         self.camera_index = camera_index
         self.height = height
@@ -19,10 +39,157 @@ class Camera:
         self.pixel_format = pixel_format
         self.enabled = enabled
         self.camera = None
+        self.threaded = threaded
+        self.queue_size = queue_size
+        self.frames = Queue(maxsize=queue_size)
+        self.producer = None
+        self.acquiring = Event()
+        self.policy = "every"
+        self.seq = 0
+        self.timestamp = None
+        # Time of arrival at the current waypoint, set by the job; earlier frames are discarded by capture steps
+        self.arrival = None
+        self.capture_time = 0.0
+        self.skipped = 0
+        self.preview = preview or {}
+        self.profile = "capture"
+
+        unknown = set(self.preview) - set(self.profile_keys)
+        if unknown:
+            raise CameraException(f"Invalid preview settings {', '.join(unknown)}, expected {self.profile_keys}")
 
     def initialize(self):
         raise NotImplementedError
 
+    def grab(self):
+        """Acquires next frame from the device."""
+        raise NotImplementedError
+
+    def capture(self, policy: str = None, since: float = None):
+        """Returns next frame, setting seq and timestamp to its sequence number and acquisition time, and
+        capture_time to the seconds spent waiting for it.
+
+        Without a threaded producer, a frame is grabbed directly from the device.
+
+        Arguments:
+            policy (str): With a threaded producer, "every" returns acquired frames in order, blocking the
+                producer while the queue is full, so that none are lost. "newest" returns the most recently
+                acquired frame, discarding older frames and never blocking the producer.
+            since (float): Discard frames acquired before this time.
+        """
+        start = time()
+        if not self.threaded:
+            data = self.grab()
+            self.seq += 1
+            self.timestamp = time()
+            self.capture_time = self.timestamp - start
+            return data
+
+        self.policy = policy or self.policy
+        if self.policy not in self.policies:
+            raise CameraException(f"Invalid capture policy {self.policy}, expected one of {self.policies}")
+
+        while True:
+            seq, timestamp, data = self.dequeue()
+            if self.policy == "newest":
+                # Drain to the most recent frame
+                while True:
+                    try:
+                        newer = self.frames.get_nowait()
+                    except Empty:
+                        break
+                    self.discard(data)
+                    seq, timestamp, data = newer
+                    if isinstance(data, Exception):
+                        break
+
+            if isinstance(data, Exception):
+                raise CameraException(f"Acquisition failed: {data}")
+            if since is None or timestamp >= since:
+                break
+            self.discard(data)
+
+        self.seq, self.timestamp = seq, timestamp
+        self.capture_time = time() - start
+        return data
+
+    def dequeue(self):
+        while True:
+            if not self.acquiring.is_set() and self.frames.empty():
+                raise CameraException("Acquisition thread is not running")
+            try:
+                return self.frames.get(timeout=.1)
+            except Empty:
+                continue
+
+    def discard(self, data):
+        self.skipped += 1
+        if isinstance(data, Frame):
+            data.release()
+
+    def start_acquisition(self):
+        if not self.threaded or self.acquiring.is_set():
+            return
+        self.acquiring.set()
+        self.producer = Thread(target=self.produce, daemon=True)
+        self.producer.start()
+        logger.info(f"Acquiring on background thread, {self.queue_size} frame queue")
+
+    def produce(self):
+        seq = 0
+        while self.acquiring.is_set():
+            try:
+                data = self.grab()
+            except Exception as e:
+                # Surfaced to the consumer by capture
+                data = e
+                self.acquiring.clear()
+            seq += 1
+            item = (seq, time(), data)
+
+            while True:
+                try:
+                    self.frames.put(item, timeout=.1)
+                    break
+                except Full:
+                    if self.policy == "newest":
+                        try:
+                            self.discard(self.frames.get_nowait()[2])
+                        except Empty:
+                            pass
+                    elif not self.acquiring.is_set():
+                        self.discard(data)
+                        break
+
+    def stop_acquisition(self):
+        self.acquiring.clear()
+        if self.producer is not None:
+            self.producer.join()
+            self.producer = None
+
+        while not self.frames.empty():
+            self.discard(self.frames.get_nowait()[2])
+
+    def use_profile(self, profile: str):
+        """Switches between the full resolution capture profile and the reduced preview profile, if configured."""
+        if profile not in self.profiles:
+            raise CameraException(f"Invalid profile {profile}, expected one of {self.profiles}")
+        if profile == self.profile or not self.preview:
+            return
+
+        # Frames queued under the previous profile are discarded
+        acquiring = self.acquiring.is_set()
+        self.stop_acquisition()
+        self.apply_profile(self.preview if profile == "preview" else {})
+        self.profile = profile
+        if acquiring:
+            self.start_acquisition()
+        logger.info(f"Using {profile} profile")
+
+    def apply_profile(self, profile: dict):
+        """Applies binning, decimation and roi from profile, restoring full resolution for those absent."""
+        raise NotImplementedError
+
     def set(self, key, value=None, perc=None):
         raise NotImplementedError
 
@@ -9,6 +9,7 @@ class OpenCV(Camera):
     capture_time = 0
     display_time = 0
     save_time = 0
+    roi = None
 
     def initialize(self):
         """Initializes camera communication and capture parameters."""
@@ -18,10 +19,22 @@ class OpenCV(Camera):
 
         if not self.camera.isOpened():
             raise CameraException("Camera initialization failed, verify camera is operational")
+        self.start_acquisition()
         return self.camera
 
-    def capture(self):
-        return self.camera.read()[1]
+    def grab(self):
+        data = self.camera.read()[1]
+        if self.roi:
+            offset_x, offset_y, width, height = self.roi
+            data = data[offset_y:offset_y + height, offset_x:offset_x + width]
+        return data
+
+    def apply_profile(self, profile: dict):
+        """Requests reduced resolution from the device for binning and decimation. ROI is cropped on the host."""
+        factor = profile.get("binning", 1) * profile.get("decimation", 1)
+        self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height // factor)
+        self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, self.width // factor)
+        self.roi = profile.get("roi")
 
     @property
     def parameters(self):
@@ -40,6 +53,7 @@ class OpenCV(Camera):
         )
 
     def shutdown(self):
+        self.stop_acquisition()
         try:
             self.camera.release()
         except AttributeError:
@@ -0,0 +1,123 @@
+import numpy as np
+
+
+# Pixel format: (pixels, bytes) per packed group
+packed_formats = {
+    "Mono12Packed": (2, 3),
+    "Mono12p": (2, 3),
+    "Mono10p": (4, 5)
+}
+
+
+def packed_size(pixel_format: str, pixels: int) -> int:
+    """Returns number of bytes occupied by pixels in packed format."""
+    group_pixels, group_bytes = packed_formats[pixel_format]
+    return -(-pixels // group_pixels) * group_bytes
+
+
+def unpack(raw: np.ndarray, pixel_format: str, shape: tuple, out: np.ndarray = None, chunk: int = 1 << 16):
+    """Unpacks 10 or 12 bit packed pixels into uint16.
+
+    Each pixel is read through an unaligned 16 bit view of the packed buffer, then shifted and masked directly
+    into out, chunk groups at a time so that intermediates remain in cache.
+
+    Mono12Packed (GigE Vision) stores the high 8 bits of each pixel of a pair in the first and last bytes and
+    both low nibbles in the middle byte. Mono12p and Mono10p (GenICam PFNC) are little-endian bit streams.
+
+    Arguments:
+        raw (np.ndarray): Packed image buffer, uint8.
+        pixel_format (str): One of Mono12Packed, Mono12p or Mono10p.
+        shape (tuple): Height and width of the image, in pixels.
+        out (np.ndarray): Preallocated uint16 output of the given shape, allocated when omitted.
+        chunk (int): Number of packed groups unpacked per pass.
+
+    Returns:
+        data (np.ndarray)
+    """
+    group_pixels, group_bytes = packed_formats[pixel_format]
+    pixels = shape[0] * shape[1]
+    groups = -(-pixels // group_pixels)
+    raw = np.ascontiguousarray(raw, dtype=np.uint8).reshape(-1)
+    if raw.size < groups * group_bytes:
+        raise ValueError(f"{pixel_format} buffer of {raw.size} bytes is too small for {shape[1]}x{shape[0]} image")
+
+    if out is None:
+        out = np.empty(shape, dtype=np.uint16)
+    elif out.shape != tuple(shape) or out.dtype != np.uint16 or not out.flags.c_contiguous:
+        raise ValueError(f"Output must be contiguous uint16 of shape {shape}")
+
+    # Images whose pixel count is not a whole number of groups unpack their final group separately
+    whole = pixels // group_pixels
+    flat = out.reshape(-1)
+    unpacked = flat[:whole * group_pixels].reshape(whole, group_pixels)
+
+    for start in range(0, whole, chunk):
+        stop = min(start + chunk, whole)
+        _unpack_groups(raw[start * group_bytes:stop * group_bytes], pixel_format, unpacked[start:stop])
+
+    if whole < groups:
+        tail = np.empty((1, group_pixels), dtype=np.uint16)
+        _unpack_groups(raw[whole * group_bytes:groups * group_bytes], pixel_format, tail)
+        flat[whole * group_pixels:] = tail[0, :pixels - whole * group_pixels]
+    return out
+
+
+# Pixel format: per pixel of a group, the byte offset of the little-endian 16 bit word containing it, the shift
+# aligning the pixel within the word, and the mask of its bits, where bits above it remain
+_fields = {
+    "Mono12p": ((0, 0, 0xFFF), (1, 4, None)),
+    "Mono10p": ((0, 0, 0x3FF), (1, 2, 0x3FF), (2, 4, 0x3FF), (3, 6, None)),
+    "Mono12Packed": ((None, None, None), (1, 4, None))
+}
+
+
+def _word(raw: np.ndarray, offset: int, stride: int, count: int, order: str = "<"):
+    # Unaligned view of the 16 bit word at offset within each group, without copying
+    return np.ndarray((count,), dtype=f"{order}u2", buffer=raw, offset=offset, strides=(stride,))
+
+
+def _unpack_groups(raw: np.ndarray, pixel_format: str, o: np.ndarray):
+    count, group_bytes = o.shape[0], packed_formats[pixel_format][1]
+    for idx, (offset, shift, mask) in enumerate(_fields[pixel_format]):
+        if offset is None:
+            continue
+        word = _word(raw, offset, group_bytes, count)
+        if not shift:
+            np.bitwise_and(word, mask, out=o[:, idx])
+            continue
+        np.right_shift(word, shift, out=o[:, idx])
+        if mask:
+            o[:, idx] &= mask
+
+    if pixel_format == "Mono12Packed":
+        # First pixel's high 8 bits precede its low nibble, so are read big-endian
+        word = _word(raw, 0, group_bytes, count, order=">")
+        np.right_shift(word, 4, out=o[:, 0])
+        o[:, 0] &= 0xFF0
+        o[:, 0] |= word & 0xF
+
+
+def pack(data: np.ndarray, pixel_format: str) -> np.ndarray:
+    """Packs uint16 pixels of 10 or 12 significant bits, the inverse of unpack."""
+    group_pixels, group_bytes = packed_formats[pixel_format]
+    flat = data.reshape(-1).astype(np.uint16)
+    padded = np.zeros(-(-flat.size // group_pixels) * group_pixels, dtype=np.uint16)
+    padded[:flat.size] = flat
+    p = padded.reshape(-1, group_pixels)
+    b = np.empty((p.shape[0], group_bytes), dtype=np.uint8)
+
+    if pixel_format == "Mono12Packed":
+        b[:, 0] = p[:, 0] >> 4
+        b[:, 1] = (p[:, 0] & 0xF) | ((p[:, 1] & 0xF) << 4)
+        b[:, 2] = p[:, 1] >> 4
+    elif pixel_format == "Mono12p":
+        b[:, 0] = p[:, 0] & 0xFF
+        b[:, 1] = (p[:, 0] >> 8) | ((p[:, 1] & 0xF) << 4)
+        b[:, 2] = p[:, 1] >> 4
+    elif pixel_format == "Mono10p":
+        b[:, 0] = p[:, 0] & 0xFF
+        b[:, 1] = (p[:, 0] >> 8) | ((p[:, 1] & 0x3F) << 2)
+        b[:, 2] = (p[:, 1] >> 6) | ((p[:, 2] & 0xF) << 4)
+        b[:, 3] = (p[:, 2] >> 4) | ((p[:, 3] & 0x3) << 6)
+        b[:, 4] = p[:, 3] >> 2
+    return b.reshape(-1)
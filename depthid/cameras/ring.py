@@ -0,0 +1,111 @@
+import logging
+from threading import Lock
+
+
+logger = logging.getLogger("depthid")
+
+
+class Frame:
+    """Driver image buffer checked out of a FrameRing.
+
+    Proxies the underlying image (e.g. PySpin Image) so existing pipeline steps may use it unchanged.
+    The holder which obtained the frame owns one reference; each additional consumer which keeps the
+    frame beyond its own step must `retain` it and later `release` it. The buffer returns to the driver
+    when the last reference is released.
+    """
+
+    def __init__(self, ring, image, frame_id: int):
+        self.ring = ring
+        self.image = image
+        self.frame_id = frame_id
+        self.refs = 1
+        self.ndarray = None
+
+    def GetNDArray(self):
+        """Returns numpy view of the image buffer, without copying."""
+        if self.ndarray is None:
+            self.ndarray = self.image.GetNDArray()
+        return self.ndarray
+
+    def retain(self):
+        with self.ring.lock:
+            self.refs += 1
+        return self
+
+    def release(self):
+        with self.ring.lock:
+            self.refs -= 1
+            if self.refs == 0:
+                self.ring.recycle(self)
+
+    def __getattr__(self, name):
+        return getattr(self.image, name)
+
+    def __repr__(self):
+        return f"Frame {self.frame_id} ({self.refs} refs)"
+
+
+class FrameRing:
+    """Bounded set of driver buffers held by the pipeline, released to the driver once consumers are done.
+
+    Counters:
+        frames:     frames pushed
+        dropped:    frames the driver acquired but never delivered, from gaps in frame IDs
+        incomplete: frames delivered incomplete and discarded
+        underruns:  frames copied to host memory because every slot was held by consumers when they arrived
+    """
+
+    def __init__(self, size: int, copy):
+        """
+        Arguments:
+            size (int): Number of driver buffers the ring may hold, leaving the remainder to the driver.
+            copy (callable): Returns a deep copy of an image which does not reference a driver buffer.
+        """
+        self.size = size
+        self.copy = copy
+        self.lock = Lock()
+        self.held = []
+        self.last_id = None
+        self.frames = 0
+        self.dropped = 0
+        self.incomplete = 0
+        self.underruns = 0
+
+    def push(self, image, frame_id: int):
+        """Checks image buffer into the ring, returning it as a Frame owned by the caller."""
+        with self.lock:
+            if self.last_id is not None and frame_id > self.last_id + 1:
+                self.dropped += frame_id - self.last_id - 1
+            self.last_id = frame_id
+            self.frames += 1
+
+            if len(self.held) >= self.size:
+                # Holding the buffer would starve the driver. Views of held frames may have escaped to
+                # consumers, so copy the new frame, which nothing references yet, and return its buffer.
+                self.underruns += 1
+                copy = self.copy(image)
+                image.Release()
+                return Frame(self, copy, frame_id)
+
+            frame = Frame(self, image, frame_id)
+            self.held.append(frame)
+        return frame
+
+    def recycle(self, frame: Frame):
+        # Called with lock held. Copied frames were never held and own no driver buffer.
+        if frame in self.held:
+            self.held.remove(frame)
+            frame.image.Release()
+
+    def clear(self):
+        with self.lock:
+            for frame in self.held:
+                frame.image.Release()
+            self.held = []
+
+    @property
+    def stats(self):
+        return dict(
+            frames=self.frames, dropped=self.dropped, incomplete=self.incomplete, underruns=self.underruns,
+            held=len(self.held)
+        )
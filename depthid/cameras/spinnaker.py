@@ -1,15 +1,23 @@
+import logging
+
 import PySpin
 
 from .camera import Camera
 from .exception import CameraException
+from .ring import FrameRing
+
+
+logger = logging.getLogger("depthid")
 
 
 class Spinnaker(Camera):
 
     nodemap = None
+    nodes = None
     cam_list = None
     system = None
     image = None
+    trigger_node = None
     pixel_format = None
     type_map = {
         'Width': PySpin.CIntegerPtr,
@@ -17,8 +25,43 @@ class Spinnaker(Camera):
         'ExposureTime': PySpin.CFloatPtr,
         'Gain': PySpin.CFloatPtr,
         'AcquisitionMode': PySpin.CEnumerationPtr,
-        'PixelFormat': PySpin.CEnumerationPtr
+        'PixelFormat': PySpin.CEnumerationPtr,
+        'TriggerMode': PySpin.CEnumerationPtr,
+        'TriggerSelector': PySpin.CEnumerationPtr,
+        'TriggerSource': PySpin.CEnumerationPtr,
+        'TriggerActivation': PySpin.CEnumerationPtr
+    }
+    # Nodes whose limits or values may change when the keyed node is written
+    dependents = {
+        'PixelFormat': ('Width', 'Height', 'ExposureTime'),
+        'Width': ('ExposureTime',),
+        'Height': ('ExposureTime',),
+        'AcquisitionMode': (),
+        'ExposureTime': (),
+        'Gain': (),
+        'TriggerMode': ('ExposureTime',),
+        # Mode, source and activation are those of the selected trigger
+        'TriggerSelector': ('TriggerMode', 'TriggerSource', 'TriggerActivation', 'ExposureTime'),
+        'TriggerSource': (),
+        'TriggerActivation': ()
     }
+    # Nodes which not every camera or firmware provides; read where available, and required only for a trigger
+    optional = ('TriggerMode', 'TriggerSelector', 'TriggerSource', 'TriggerActivation')
+    trigger_timeout_ms = 1000
+
+    def __init__(self, *args, buffers: int = 10, trigger: str = None, **kwargs):
+        """
+        Arguments:
+            buffers (int): Number of driver stream buffers. All but one may be held by the pipeline at once.
+            trigger (str): Trigger source, "Software" to expose once per capture or a line such as "Line0" to
+                expose on its rising edge. Acquisition is free-running when unset.
+        """
+        super().__init__(*args, **kwargs)
+        self.buffers = buffers
+        self.trigger = trigger
+        self.ring = FrameRing(size=buffers - 1, copy=PySpin.Image.Create)
+        if trigger == "Software" and self.threaded:
+            raise CameraException("Software trigger cannot be used with threaded acquisition")
 
     def initialize(self):
         self.system = PySpin.System.GetInstance()
@@ -45,6 +88,7 @@ class Spinnaker(Camera):
         self.set("Height", self.height)
         self.set("ExposureTime", self.exposure_us)
         self.set("Gain", self.gain_db)
+        self.set_trigger()
 
         # Get newest image only
         s_node_map = self.camera.GetTLStreamNodeMap()
@@ -52,6 +96,11 @@ class Spinnaker(Camera):
         handling_mode_entry = handling_mode.GetEntryByName('NewestOnly')
         handling_mode.SetIntValue(handling_mode_entry.GetValue())
 
+        # Allocate enough buffers for the ring to hold frames while the driver continues acquiring
+        count_mode = PySpin.CEnumerationPtr(s_node_map.GetNode('StreamBufferCountMode'))
+        count_mode.SetIntValue(count_mode.GetEntryByName('Manual').GetValue())
+        PySpin.CIntegerPtr(s_node_map.GetNode('StreamBufferCountManual')).SetValue(self.buffers)
+
         # Set pixel format
         try:
             self.set_enum("PixelFormat", self.pixel_format.replace(' ', ''))
@@ -60,13 +109,86 @@ class Spinnaker(Camera):
             raise CameraException(f"Invalid pixel format: {self.pixel_format}")
 
         self.camera.BeginAcquisition()
+        self.start_acquisition()
         return self.camera
 
-    def capture(self):
-        self.image = self.camera.GetNextImage()
-        self.image.Release()
+    def set_trigger(self):
+        """Configures frame start trigger. Trigger mode must be off while the trigger is configured."""
+        if self.trigger is None:
+            if 'TriggerMode' in self.nodes:
+                self.set_enum('TriggerMode', 'Off')
+            return
+
+        required = ('TriggerMode', 'TriggerSelector', 'TriggerSource') + (
+            ('TriggerActivation',) if self.trigger != "Software" else ()
+        )
+        missing = [key for key in required if key not in self.nodes]
+        if missing:
+            raise CameraException(f"Trigger {self.trigger} requires {', '.join(missing)}, not supported by {self}")
+
+        self.set_enum('TriggerMode', 'Off')
+        self.trigger_node = PySpin.CCommandPtr(self.nodemap.GetNode('TriggerSoftware'))
+        self.set_enum('TriggerSelector', 'FrameStart')
+        self.set_enum('TriggerSource', self.trigger)
+        if self.trigger != "Software":
+            self.set_enum('TriggerActivation', 'RisingEdge')
+        self.set_enum('TriggerMode', 'On')
+        logger.info(f"Triggering on {self.trigger}")
+
+    def grab(self):
+        """Returns next complete image as a Frame, whose buffer returns to the driver once released.
+
+        With a software trigger, exposure begins when grab is called, so the frame is known to postdate any
+        preceding move.
+        """
+        while True:
+            if self.trigger is None:
+                image = self.camera.GetNextImage()
+            else:
+                if self.trigger == "Software":
+                    self.trigger_node.Execute()
+                try:
+                    image = self.camera.GetNextImage(self.trigger_timeout_ms + int(self.exposure_us / 1000))
+                except PySpin.SpinnakerException as e:
+                    raise CameraException(f"No frame within timeout of trigger on {self.trigger}: {e}")
+            if not image.IsIncomplete():
+                break
+            self.ring.incomplete += 1
+            image.Release()
+
+        self.image = self.ring.push(image, image.GetFrameID())
         return self.image
 
+    def apply_profile(self, profile: dict):
+        """Applies sensor binning, decimation and ROI. Acquisition is paused, as these set the image size."""
+        factor = profile.get("binning", 1) * profile.get("decimation", 1)
+        offset_x, offset_y, width, height = profile.get("roi", (0, 0, self.width // factor, self.height // factor))
+
+        self.camera.EndAcquisition()
+        for key in ("Binning", "Decimation"):
+            for axis in ("Horizontal", "Vertical"):
+                self.set_int(f"{key}{axis}", profile.get(key.lower(), 1))
+
+        # Offsets limit the maximum size, so are cleared before the size is set
+        self.set_int("OffsetX", 0)
+        self.set_int("OffsetY", 0)
+        for key in ("Width", "Height", "ExposureTime"):
+            self.read_node(key)
+        self.set("Width", width)
+        self.set("Height", height)
+        self.set_int("OffsetX", offset_x)
+        self.set_int("OffsetY", offset_y)
+        self.camera.BeginAcquisition()
+
+    def set_int(self, key, value):
+        """Writes integer node outside the cached model. Unsupported nodes are tolerated if left at default."""
+        node = PySpin.CIntegerPtr(self.nodemap.GetNode(key))
+        if not PySpin.IsAvailable(node) or not PySpin.IsWritable(node):
+            if value in (0, 1):
+                return
+            raise CameraException(f"{key} is not supported by {self}")
+        node.SetValue(value)
+
     def get_transport_features(self):
         """Obtains device information from transport layer."""
         nodemap = self.camera.GetTLDeviceNodeMap()
@@ -79,18 +201,40 @@ class Spinnaker(Camera):
                 self.features[node_feature.GetName()] = None
 
     def get_camera_features(self):
+        """Reads limits, choices and values of every modelled node, caching node handles for later access.
+
+        Optional nodes which the camera does not provide, or cannot currently read, are omitted from nodes.
+        """
+        self.nodes = {}
         for f, f_type in self.type_map.items():
-            if f_type is not PySpin.CEnumerationPtr:
-                node = f_type(self.nodemap.GetNode(f))
-                self.features[f"{f}Min"] = node.GetMin()
-                self.features[f"{f}Max"] = node.GetMax()
-                self.features[f"{f}Range"] = self.features[f"{f}Max"] - self.features[f"{f}Min"]
-                self.settings[f] = node.GetValue()
-                self.settings[f"{f}%"] = (self.settings[f] - self.features[f"{f}Min"]) / self.features[f"{f}Range"]
-            else:
-                node = f_type(self.nodemap.GetNode(f))
-                self.features[f"{f}Choices"] = ",".join([e.GetDisplayName() for e in node.GetEntries()])
-                self.settings[f] = node.GetCurrentEntry().GetDisplayName()
+            node = f_type(self.nodemap.GetNode(f))
+            if f in self.optional and not (PySpin.IsAvailable(node) and PySpin.IsReadable(node)):
+                logger.debug(f"{f} is not available on {self}")
+                continue
+            self.nodes[f] = node
+            self.read_node(f)
+
+    def read_node(self, key, limits=True):
+        """Reads node value into settings and, when limits is set, its limits or enum choices into features."""
+        node = self.nodes[key]
+        if self.type_map[key] is not PySpin.CEnumerationPtr:
+            if limits:
+                self.features[f"{key}Min"] = node.GetMin()
+                self.features[f"{key}Max"] = node.GetMax()
+                self.features[f"{key}Range"] = self.features[f"{key}Max"] - self.features[f"{key}Min"]
+            self.settings[key] = node.GetValue()
+            self.settings[f"{key}%"] = (self.settings[key] - self.features[f"{key}Min"]) / self.features[f"{key}Range"]
+        else:
+            if limits:
+                self.features[f"{key}Choices"] = ",".join([e.GetDisplayName() for e in node.GetEntries()])
+            self.settings[key] = node.GetCurrentEntry().GetDisplayName()
+
+    def refresh(self, key):
+        """Rereads node after a write, along with the limits and values of nodes which depend on it."""
+        self.read_node(key, limits=False)
+        for dependent in self.dependents.get(key, ()):
+            if dependent in self.nodes:
+                self.read_node(dependent)
 
     def set(self, key, value=None, perc=None):
         if value is not None:
@@ -99,14 +243,13 @@ class Spinnaker(Camera):
             perc = min(1.0, max(0, perc))
             value = (self.features[f"{key}Range"] * perc) + self.features[f"{key}Min"]
 
-        node = self.type_map[key](self.nodemap.GetNode(key))
         # Normal for some values to be quantized
-        node.SetValue(value)
-        self.get_camera_features()
+        self.nodes[key].SetValue(value)
+        self.refresh(key)
         return self.settings[key]
 
     def set_enum(self, key, value):
-        node = self.type_map[key](self.nodemap.GetNode(key))
+        node = self.nodes[key]
         entry = node.GetEntryByName(value)
 
         try:
@@ -114,10 +257,15 @@ class Spinnaker(Camera):
         except AttributeError:
             raise CameraException(f"Invalid {key} setting: {value}")
 
-        self.get_camera_features()
+        self.refresh(key)
         return self.settings[key]
 
     def shutdown(self):
+        self.stop_acquisition()
+        logger.info(f"Frames: {', '.join(f'{k} {v}' for k, v in self.ring.stats.items())}")
+        self.image = None
+        self.ring.clear()
+
         try:
             self.camera.EndAcquisition()
         except (AttributeError, PySpin.SpinnakerException):
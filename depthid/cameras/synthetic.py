@@ -0,0 +1,256 @@
+import logging
+import re
+from time import sleep, time
+
+import cv2
+import numpy as np
+
+from .camera import Camera
+from .exception import CameraException
+from .packing import pack, packed_formats
+
+
+logger = logging.getLogger("depthid")
+
+
+class SyntheticImage:
+    """Generated frame exposing the subset of the PySpin Image interface used by the spinnaker pipeline steps."""
+
+    def __init__(self, data: np.ndarray, frame_id: int, timestamp: float, pixel_format: str, shape: tuple = None):
+        """
+        Arguments:
+            data (np.ndarray): Pixels, or the packed buffer for packed pixel formats.
+            pixel_format (str): Pixel format name, e.g. Mono16.
+            shape (tuple): Height and width, where data is packed.
+        """
+        self.data = data
+        self.frame_id = frame_id
+        self.timestamp = timestamp
+        self.pixel_format = pixel_format
+        self.shape = shape or data.shape
+
+    def GetNDArray(self):
+        return self.data
+
+    def GetData(self):
+        return self.data.reshape(-1)
+
+    def GetPixelFormatName(self):
+        return self.pixel_format
+
+    def GetWidth(self):
+        return self.shape[1]
+
+    def GetHeight(self):
+        return self.shape[0]
+
+    def GetFrameID(self):
+        return self.frame_id
+
+    def GetTimeStamp(self):
+        return int(self.timestamp * 1e9)
+
+    def IsIncomplete(self):
+        return False
+
+    def Release(self):
+        pass
+
+    def Save(self, filename: str):
+        if filename.endswith(".raw"):
+            self.data.tofile(filename)
+            return True
+        return cv2.imwrite(filename, self.data)
+
+
+class Synthetic(Camera):
+    """Generates frames of a seeded scatter-point scene, for running pipelines without camera hardware.
+
+    The scene is a uniform background with scatter points of random position and brightness. Each frame adds
+    Gaussian noise, drawn from a bank of precomputed fields, and brightness scales with exposure and gain
+    relative to their initial values. When defocus is set and the camera is bound to a controller, the scene is
+    blurred in proportion to the distance of controller z from focus_z.
+
+    Frames are paced to frame_rate as a free-running camera would be, and may be captured with the spinnaker
+    capture and transform_ndarray pipeline steps. A preview profile bins, decimates or crops the scene.
+    """
+
+    format_pattern = re.compile(r"^(Mono|Bayer(RG|GR|GB|BG))(8|16)$")
+    # Relative response of red, green and blue photosites
+    bayer_gains = {"R": .6, "G": 1.0, "B": .4}
+    bayer_tiles = {"RG": "RGGB", "GR": "GRBG", "GB": "GBRG", "BG": "BGGR"}
+    ranges = {"ExposureTime": (10.0, 1e6), "Gain": (0.0, 48.0)}
+    noise_frames = 8
+    cache_size = 32
+
+    def __init__(self, *args, bit_depth: int = None, frame_rate: float = 30.0, seed: int = 0,
+                 scatter_points: int = 200, background: float = .1, noise: float = .02, defocus: float = 0.0,
+                 focus_z: float = 0.0, **kwargs):
+        """
+        Arguments:
+            bit_depth (int): Significant bits per pixel, defaulting to the pixel format's container size.
+            frame_rate (float): Frames per second, or 0 to generate frames as fast as they are captured.
+            seed (int): Seed for the scene and noise, so that runs are repeatable.
+            scatter_points (int): Number of scatter points in the scene.
+            background (float): Background level, as a fraction of full scale.
+            noise (float): Standard deviation of noise, as a fraction of full scale.
+            defocus (float): Blur sigma, in pixels per mm of z from focus_z.
+            focus_z (float): z position at which the scene is in focus.
+        """
+        super().__init__(*args, **kwargs)
+        self.format = self.pixel_format.replace(' ', '')
+        match = self.format_pattern.match(self.format)
+        if self.format in packed_formats:
+            # Packed pixels are generated as uint16, then packed
+            self.container_bits = 16
+            format_bits = int(self.format[4:6])
+            self.bayer = None
+        elif match:
+            self.container_bits = format_bits = int(match.group(3))
+            self.bayer = match.group(2)
+        else:
+            raise CameraException(
+                f"Invalid pixel format: {self.pixel_format}, expected Mono or Bayer 8 or 16 bit, or one of "
+                f"{', '.join(packed_formats)}"
+            )
+
+        self.bit_depth = bit_depth or format_bits
+        if self.bit_depth > format_bits:
+            raise CameraException(f"Bit depth {self.bit_depth} exceeds {self.pixel_format} container")
+        self.dtype = np.uint8 if self.container_bits == 8 else np.uint16
+        self.max_value = 2 ** self.bit_depth - 1
+
+        self.frame_rate = frame_rate
+        self.seed = seed
+        self.scatter_points = scatter_points
+        self.background = background
+        self.noise = noise
+        self.defocus = defocus
+        self.focus_z = focus_z
+        # Exposure and gain at which the scene renders at nominal brightness
+        self.reference = (self.exposure_us, self.gain_db)
+        self.features = {"DeviceDisplayName": "Synthetic"}
+        self.settings = {"Width": self.width, "Height": self.height, "PixelFormat": self.format}
+        self.controller = None
+        self.rng = None
+        self.scene = None
+        self.full_scene = None
+        self.factor = 1
+        self.noise_bank = None
+        self.blurred = {}
+        self.frame_id = 0
+        self.next_frame = 0.0
+
+    def initialize(self):
+        self.rng = np.random.RandomState(self.seed)
+        self.scene = self.render_scene()
+        self.noise_bank = [
+            (self.rng.standard_normal((self.height, self.width)) * self.noise).astype(np.float32)
+            for _ in range(self.noise_frames)
+        ]
+
+        for key, (lo, hi) in self.ranges.items():
+            self.features[f"{key}Min"], self.features[f"{key}Max"], self.features[f"{key}Range"] = lo, hi, hi - lo
+        self.set("ExposureTime", self.exposure_us)
+        self.set("Gain", self.gain_db)
+
+        self.full_scene = self.scene
+        self.camera = self
+        self.next_frame = time()
+        self.start_acquisition()
+        return self.camera
+
+    def render_scene(self):
+        """Renders background and scatter points, scaled for the Bayer filter where applicable."""
+        scene = np.zeros((self.height, self.width), dtype=np.float32)
+        ys = self.rng.randint(0, self.height, self.scatter_points)
+        xs = self.rng.randint(0, self.width, self.scatter_points)
+        scene[ys, xs] = self.rng.uniform(.2, .9, self.scatter_points)
+
+        # Spread each point into a spot, preserving its peak brightness
+        sigma = 1.5
+        scene = cv2.GaussianBlur(scene, (0, 0), sigma) * (2 * np.pi * sigma ** 2)
+        scene += self.background
+
+        if self.bayer:
+            tile = [self.bayer_gains[c] for c in self.bayer_tiles[self.bayer]]
+            gains = np.array(tile, dtype=np.float32).reshape(2, 2)
+            scene *= np.tile(gains, (self.height // 2 + 1, self.width // 2 + 1))[:self.height, :self.width]
+        return scene
+
+    def apply_profile(self, profile: dict):
+        """Bins, decimates and crops the scene as the sensor would."""
+        binning, decimation = profile.get("binning", 1), profile.get("decimation", 1)
+        scene = self.full_scene[::decimation, ::decimation]
+        if binning > 1:
+            h, w = scene.shape[0] // binning * binning, scene.shape[1] // binning * binning
+            scene = scene[:h, :w].reshape(h // binning, binning, w // binning, binning).mean(axis=(1, 3))
+        if profile.get("roi"):
+            offset_x, offset_y, width, height = profile["roi"]
+            scene = scene[offset_y:offset_y + height, offset_x:offset_x + width]
+
+        self.scene = np.ascontiguousarray(scene)
+        self.factor = binning * decimation
+        self.blurred = {}
+        self.settings.update(Height=self.scene.shape[0], Width=self.scene.shape[1])
+
+    def z(self):
+        """Returns controller z, from the latest status report where available."""
+        if self.controller is None:
+            return self.focus_z
+        report = getattr(self.controller.reader, "report", None)
+        position = report["position"] if report else self.controller.position
+        return float(position.get("z", self.focus_z))
+
+    def focused_scene(self):
+        sigma = round(self.defocus * abs(self.z() - self.focus_z) / self.factor, 1)
+        if not sigma:
+            return self.scene
+        if sigma not in self.blurred:
+            if len(self.blurred) >= self.cache_size:
+                self.blurred.clear()
+            self.blurred[sigma] = cv2.GaussianBlur(self.scene, (0, 0), sigma)
+        return self.blurred[sigma]
+
+    def grab(self):
+        if self.frame_rate:
+            wait = self.next_frame - time()
+            if wait > 0:
+                sleep(wait)
+            # Late captures receive the frame acquired in the meantime, as from a free-running camera
+            self.next_frame = max(self.next_frame + 1 / self.frame_rate, time())
+
+        exposure_us, gain_db = self.reference
+        scale = self.settings["ExposureTime"] / exposure_us * 10 ** ((self.settings["Gain"] - gain_db) / 20)
+        scene = self.focused_scene()
+        noise = self.noise_bank[self.rng.randint(self.noise_frames)][:scene.shape[0], :scene.shape[1]]
+        data = scene * scale + noise
+        np.clip(data, 0, 1, out=data)
+        data *= self.max_value
+
+        self.frame_id += 1
+        data = data.astype(self.dtype)
+        if self.format in packed_formats:
+            return SyntheticImage(pack(data, self.format), self.frame_id, time(), self.format, data.shape)
+        return SyntheticImage(data, self.frame_id, time(), self.format)
+
+    def set(self, key, value=None, perc=None):
+        if key not in self.ranges:
+            raise CameraException(f"Synthetic camera does not support setting {key}")
+
+        if value is not None:
+            value = max(self.features[f"{key}Min"], min(value, self.features[f"{key}Max"]))
+        elif perc is not None:
+            perc = min(1.0, max(0, perc))
+            value = (self.features[f"{key}Range"] * perc) + self.features[f"{key}Min"]
+
+        self.settings[key] = value
+        self.settings[f"{key}%"] = (value - self.features[f"{key}Min"]) / self.features[f"{key}Range"]
+        return self.settings[key]
+
+    def shutdown(self):
+        self.stop_acquisition()
+        self.blurred = {}
+
+    def __repr__(self):
+        return f"Synthetic {self.width}x{self.height} {self.pixel_format}"
@@ -0,0 +1,242 @@
+import argparse
+import logging
+import os
+from threading import Lock
+
+import cv2
+import numpy as np
+
+
+logger = logging.getLogger("depthid")
+
+# File layout:
+#   header:  magic, version
+#   chunks:  record, padding, frame data aligned to ALIGN bytes; appended as frames are saved
+#   index:   every chunk's record, in frame order, with INDEX magic, written on close
+#   trailer: magic, frame count, offset of the index
+# Each chunk's record is also written ahead of its data, so that the index of a file which was not closed,
+# e.g. on a crash, is recovered by walking the chunks.
+# Save format naming the container, and its extension
+CONTAINER = "dids"
+MAGIC = b"DIDS"
+CHUNK = b"FRAM"
+# Index records differ from chunk records, so that recovery does not mistake an index without trailer for chunks
+INDEX = b"FIDX"
+TRAILER = b"DIDX"
+VERSION = 1
+ALIGN = 4096
+AXES = ("x", "y", "z")
+
+header = np.dtype([("magic", "S4"), ("version", "<u4"), ("reserved", "<u8")])
+trailer = np.dtype([("magic", "S4"), ("reserved", "<u4"), ("count", "<u8"), ("offset", "<u8")])
+record = np.dtype([
+    ("magic", "S4"), ("ndim", "<u4"), ("frame", "<u8"), ("offset", "<u8"), ("nbytes", "<u8"),
+    ("shape", "<u4", (4,)), ("dtype", "S8"),
+    # Waypoint, NaN for axes not given
+    ("x", "<f8"), ("y", "<f8"), ("z", "<f8"),
+    ("timestamp", "<f8"), ("exposure_us", "<f8"), ("gain_db", "<f8")
+])
+
+
+class ContainerException(Exception):
+    pass
+
+
+class ContainerWriter:
+    """Appends frames to a single session file, with an index of each frame's position and metadata.
+
+    Opening an existing container appends to it. Frames may be appended from several threads.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = Lock()
+        if os.path.exists(path):
+            self.fh = open(path, "r+b")
+            self.records, end = _load_index(self.fh)
+            self.records = list(self.records)
+            # The index is rewritten on close, following the new frames
+            self.fh.truncate(end)
+            self.fh.seek(end)
+        else:
+            self.fh = open(path, "w+b")
+            self.records = []
+            self.fh.write(np.array((MAGIC, VERSION, 0), dtype=header).tobytes())
+
+    def append(self, data: np.ndarray, waypoint: dict = None, timestamp: float = np.nan,
+               exposure_us: float = np.nan, gain_db: float = np.nan) -> int:
+        """Appends frame, returning the number of bytes written.
+
+        Arguments:
+            data (np.ndarray): Frame, of up to 4 dimensions.
+            waypoint (dict): Position by axis, e.g. {"x": "0.000", "z": "1.500"}.
+            timestamp (float): Seconds since the epoch.
+        """
+        data = np.ascontiguousarray(data)
+        if data.ndim > 4:
+            raise ContainerException(f"Frames of up to 4 dimensions may be stored, got {data.ndim}")
+        waypoint = waypoint or {}
+        with self.lock:
+            if self.fh is None:
+                raise ContainerException(f"{self.path} is closed")
+            start = self.fh.tell()
+            offset = _aligned(start + record.itemsize)
+            entry = np.zeros((), dtype=record)
+            entry["magic"], entry["ndim"], entry["frame"] = CHUNK, data.ndim, len(self.records)
+            entry["offset"], entry["nbytes"], entry["dtype"] = offset, data.nbytes, data.dtype.str
+            entry["shape"][:data.ndim] = data.shape
+            for axis in AXES:
+                entry[axis] = float(waypoint[axis]) if waypoint.get(axis) not in (None, "") else np.nan
+            entry["timestamp"], entry["exposure_us"], entry["gain_db"] = timestamp, exposure_us, gain_db
+
+            self.fh.write(entry.tobytes())
+            self.fh.write(bytes(offset - start - record.itemsize))
+            self.fh.write(memoryview(data.reshape(-1).view(np.uint8)))
+            self.records.append(entry[()])
+            return offset + data.nbytes - start
+
+    def close(self):
+        """Writes the index and trailer."""
+        with self.lock:
+            if self.fh is None:
+                return
+            offset = self.fh.tell()
+            index = np.array(self.records, dtype=record)
+            index["magic"] = INDEX
+            self.fh.write(index.tobytes())
+            self.fh.write(np.array((TRAILER, 0, len(self.records), offset), dtype=trailer).tobytes())
+            self.fh.close()
+            self.fh = None
+        logger.info(f"Wrote {len(self.records)} frames to {self.path}")
+
+    def __len__(self):
+        return len(self.records)
+
+
+class ContainerReader:
+    """Reads frames of a session container, memory-mapped, by frame number or waypoint.
+
+    Frames are read-only views of the mapped file, so only pages which are accessed are read.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as fh:
+            self.index, _ = _load_index(fh)
+        self.mm = np.memmap(path, dtype=np.uint8, mode="r") if len(self.index) else None
+        # Waypoint: frame numbers at it, in order
+        self.waypoints = {}
+        for entry in self.index:
+            self.waypoints.setdefault(_key(entry), []).append(int(entry["frame"]))
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, frame: int) -> np.ndarray:
+        entry = self.index[frame]
+        offset, nbytes = int(entry["offset"]), int(entry["nbytes"])
+        shape = tuple(int(n) for n in entry["shape"][:entry["ndim"]])
+        return self.mm[offset:offset + nbytes].view(np.dtype(entry["dtype"].decode())).reshape(shape)
+
+    def __iter__(self):
+        for frame in range(len(self)):
+            yield self[frame]
+
+    def lookup(self, x: float = None, y: float = None, z: float = None) -> list:
+        """Returns numbers of frames saved at waypoint, omitting axes which were not given when saved."""
+        return list(self.waypoints.get(tuple(None if v is None else round(float(v), 3) for v in (x, y, z)), []))
+
+    def metadata(self, frame: int) -> dict:
+        entry = self.index[frame]
+        return {
+            "frame": int(entry["frame"]),
+            "shape": tuple(int(n) for n in entry["shape"][:entry["ndim"]]),
+            "dtype": entry["dtype"].decode(),
+            "waypoint": {axis: float(entry[axis]) for axis in AXES if not np.isnan(entry[axis])},
+            "timestamp": float(entry["timestamp"]),
+            "exposure_us": float(entry["exposure_us"]),
+            "gain_db": float(entry["gain_db"])
+        }
+
+    def export(self, directory: str, fmt: str = "tiff") -> int:
+        """Writes each frame to its own file, named as Job.save names them, returning the number written."""
+        os.makedirs(directory, exist_ok=True)
+        for frame in range(len(self)):
+            waypoint = self.metadata(frame)["waypoint"]
+            fn = f"{directory}/{frame}_{','.join(f'{v:.3f}' for v in waypoint.values())}.{fmt}"
+            if not cv2.imwrite(fn, np.asarray(self[frame])):
+                raise ContainerException(f"Unable to write {fn}")
+            logger.info(f"Exported {fn}")
+        return len(self)
+
+    def close(self):
+        self.mm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGN) * ALIGN
+
+
+def _key(entry) -> tuple:
+    return tuple(None if np.isnan(entry[axis]) else round(float(entry[axis]), 3) for axis in AXES)
+
+
+def _load_index(fh):
+    # Returns the index, and the offset at which chunks end
+    fh.seek(0, os.SEEK_END)
+    size = fh.tell()
+    fh.seek(0)
+    head = np.frombuffer(fh.read(header.itemsize), dtype=header)
+    if len(head) != 1 or head["magic"][0] != MAGIC:
+        raise ContainerException(f"{fh.name} is not a session container")
+    if head["version"][0] != VERSION:
+        raise ContainerException(f"{fh.name} is version {head['version'][0]}, expected {VERSION}")
+
+    if size >= header.itemsize + trailer.itemsize:
+        fh.seek(size - trailer.itemsize)
+        tail = np.frombuffer(fh.read(trailer.itemsize), dtype=trailer)[0]
+        count, offset = int(tail["count"]), int(tail["offset"])
+        if tail["magic"] == TRAILER and offset + count * record.itemsize + trailer.itemsize == size:
+            fh.seek(offset)
+            return np.frombuffer(fh.read(count * record.itemsize), dtype=record), offset
+
+    # Not closed; walk the chunks, dropping any incomplete final frame. Each chunk's data follows its record.
+    entries = []
+    end = header.itemsize
+    while end + record.itemsize <= size:
+        fh.seek(end)
+        entry = np.frombuffer(fh.read(record.itemsize), dtype=record)[0]
+        if (
+            entry["magic"] != CHUNK or entry["frame"] != len(entries) or
+            entry["offset"] < end + record.itemsize or entry["offset"] + entry["nbytes"] > size
+        ):
+            break
+        entries.append(entry)
+        end = int(entry["offset"] + entry["nbytes"])
+    logger.warning(f"{fh.name} was not closed, recovered {len(entries)} frames")
+    return np.array(entries, dtype=record), end
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s [%(levelname)-5.5s] %(message)s", level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        prog="python -m depthid.container", description="List or export the frames of a session container."
+    )
+    parser.add_argument('container', help='Session container, e.g. session.dids')
+    parser.add_argument('--export', metavar='DIRECTORY', help='Write each frame to its own file in DIRECTORY')
+    parser.add_argument('--format', default="tiff", help='Exported file format, by extension (default: tiff)')
+    args = parser.parse_args()
+
+    with ContainerReader(args.container) as reader:
+        if args.export:
+            logger.info(f"Exported {reader.export(args.export, args.format)} frames to {args.export}")
+        else:
+            for frame in range(len(reader)):
+                logger.info(reader.metadata(frame))
@@ -1,11 +1,16 @@
 import logging
 import re
-from time import sleep, time
+from collections import deque
+from queue import Empty
+from time import time
 
+import numpy as np
 from serial import Serial, SerialException
 
 from .exception import ControllerException
+from .kinematics import Kinematics
 from .motor import Motor
+from .reader import Reader
 
 
 logger = logging.getLogger("depthid")
@@ -18,17 +23,34 @@ class Controller:
     banner = None
     est_step_time = 0.04
     est_move_time = 0.06
+    rx_buffer_size = 128
+    jog_feed = 8000
+    status_query = "?"
+    idle_state = "Idle"
     pos_pattern = re.compile(r"MPos:(?P<x>[\d.-]+),?(?P<y>[\d.-]+)?,?(?P<z>[\d.-]+)?")
-
-    def __init__(self, device_name: str, baud_rate: int, motors: list):
+    setting_pattern = re.compile(r"^\$(?P<key>\d+)=(?P<value>[\d.-]+)")
+    # Seconds before predicted arrival at which status is first queried, and between queries thereafter
+    eta_lead = .02
+    eta_poll = .02
+    # Waypoint timeout as a multiple of predicted duration, plus margin in seconds
+    eta_tolerance = 1.5
+    eta_margin = .25
+
+    def __init__(self, device_name: str, baud_rate: int, motors: list, status_interval: float = .1):
         """
         Arguments:
             device_name (str): Device name, e.g. '/dev/tty.usbserial-A8008pzh' Mac/Linux, 'COM1' Windows.
             baud_rate (int): Baud rate for serial connection. Default: 9600.
+            status_interval (float): Seconds between status queries. Grbl recommends no more than 5-10Hz.
         """
         self.device_name = device_name
         self.baud_rate = baud_rate
+        self.status_interval = status_interval
         self.serial = None
+        self.reader = None
+        self.settings = {}
+        self.kinematics = None
+        self.eta = None
         self.motors = {axis: Motor(axis, microstep) for axis, microstep in motors}
         self.position = {axis: '0.000' for axis in self.motors}
 
@@ -38,18 +60,24 @@ class Controller:
         except SerialException as e:
             raise ControllerException(f"Failed to connect to {self.device_name}, {e}")
 
+        self.reader = Reader(self.serial, self.pos_pattern, self.status_query, self.status_interval)
+        self.reader.start()
+
     def initialize(self, connect=True):
         """Initializes communication with serial device and returns instance."""
 
         if connect:
             self.connect()
 
-        message = [self.receive() for _ in range(2)][1]
-
-        try:
-            assert self.banner in message
-        except AssertionError:
-            raise ControllerException(f"Failed to receive init from controller; expected {self.banner}' in '{message}'")
+        message = ""
+        deadline = time() + self.timeout
+        while self.banner not in message:
+            try:
+                message = self.receive(timeout=deadline - time())
+            except TimeoutError:
+                raise ControllerException(
+                    f"Failed to receive init from controller; expected '{self.banner}' in '{message}'"
+                )
 
         self.send("G0")
 
@@ -63,33 +91,55 @@ class Controller:
             self.send(f"${i} = {v}")
             self.wait_for("ok")
 
+        self.read_settings()
+
         return self.serial
 
+    def read_settings(self):
+        """Reads controller settings, building the kinematic model from max rates and accelerations.
+
+        Controllers which do not report $110-$112 and $120-$122 fall back to est_step_time estimates.
+        """
+        self.send("$$")
+        self.wait_for("ok")
+
+        # Settings are received before the acknowledgement
+        while not self.reader.messages.empty():
+            m = self.setting_pattern.search(self.reader.messages.get_nowait())
+            if m:
+                self.settings[int(m.group("key"))] = float(m.group("value"))
+
+        try:
+            self.kinematics = Kinematics.from_settings(self.settings)
+        except KeyError:
+            logger.warning(f"{self} did not report max rates and accelerations, using estimated move times")
+        else:
+            logger.info(
+                f"Max rates {self.kinematics.max_rates} mm/min, "
+                f"accelerations {self.kinematics.accelerations} mm/sec^2"
+            )
+        return self.settings
+
     def send(self, message, send_linefeed=True):
         linefeed = self.linefeed if send_linefeed else ""
         try:
-            self.serial.write(f"{message}{linefeed}".encode())
-            self.serial.flush()
+            self.reader.write(f"{message}{linefeed}".encode())
         except SerialException as e:
             raise ControllerException(f"Failed to send {message} to controller: {e}")
         else:
             logger.debug(f"Sent {message}")
 
-    def receive(self):
-        try:
-            message = self.serial.readline()
-        except SerialException as e:
-            raise ControllerException(f"Failed to receive message from controller: {e}")
+    def receive(self, timeout: float = None):
+        """Returns next message which is neither an acknowledgement, alarm, nor status report.
 
+        Raises:
+            TimeoutError: No message arrived within timeout seconds (default: Controller.timeout).
+        """
+        timeout = self.timeout if timeout is None else timeout
         try:
-            message = message.decode()
-        except UnicodeDecodeError as e:
-            raise ControllerException(f"Failed to decode {message} from controller: {e}")
-        else:
-            message = message.rstrip()
-            logger.debug(f"Recv {message}")
-
-        return message
+            return self.reader.messages.get(timeout=max(timeout, 0))
+        except Empty:
+            raise TimeoutError
 
     def move(self, waypoint):
         """Move specified axis to absolute position.
@@ -102,12 +152,103 @@ class Controller:
             G90: Switch to absolution positioning mode
             G91: Switch to incremental positioning mode
         """
-        cmd = "G0 G90 G53 {}".format(
+        self.send(self.move_command(waypoint))
+        self.wait_for("ok")
+        return self.wait_waypoint(waypoint)
+
+    @staticmethod
+    def move_command(waypoint):
+        return "G0 G90 G53 {}".format(
             " ".join([f"{k.upper()}{v}" for k, v in waypoint.items() if v is not None])
         )
-        self.send(cmd)
+
+    def stream(self, waypoints, dwell: float = 0.0):
+        """Streams waypoints to controller, yielding each waypoint once the stage has come to rest upon it.
+
+        Uses the character-counting scheme from Grbl's stream.py: lines are sent for as long as the sum of
+        unacknowledged line lengths fits within the controller's RX buffer, and each acknowledgement frees the
+        length of the oldest outstanding line.
+
+        Each move is followed by a G4 P0 sync marker. Grbl only acknowledges a dwell once the planner has
+        drained, so the sync acknowledgement signals arrival. When dwell is non-zero, a G4 dwell of that many
+        seconds follows the marker, holding the stage at rest while the next waypoint's move is already queued
+        behind it; capture must complete within the dwell. When dwell is zero, lines for the next waypoint are
+        held back until the caller resumes the generator.
+
+        Arguments:
+            waypoints (iterable): Waypoint dicts, e.g. {'x': '1.000', 'y': '0.000'}
+            dwell (float): Seconds to hold at each waypoint after arrival.
+        """
+        lines = (
+            (line, marker)
+            for waypoint in waypoints
+            for line, marker in (
+                (self.move_command(waypoint), None),
+                ("G4 P0", waypoint),
+                (f"G4 P{dwell:.3f}" if dwell else None, None)
+            )
+            if line is not None
+        )
+        pending = deque()
+        buffered = 0
+        held = False
+        line, marker = next(lines, (None, None))
+
+        while line is not None or pending:
+            # Fill the RX buffer, unless awaiting arrival with nothing to hold the stage at rest
+            while line is not None and not held and buffered + len(line) + 1 < self.rx_buffer_size:
+                self.send(line)
+                pending.append((line, marker))
+                buffered += len(line) + 1
+                held = marker is not None and not dwell
+                line, marker = next(lines, (None, None))
+
+            try:
+                self.wait_for("ok")
+            except ControllerException as e:
+                raise ControllerException(f"Controller rejected streamed line {pending[0][0]}: {e}")
+
+            acked, waypoint = pending.popleft()
+            buffered -= len(acked) + 1
+            if waypoint is not None:
+                self.position.update(waypoint)
+                held = False
+                yield waypoint
+
+    def sweep(self, waypoint: dict, feed: float):
+        """Starts a linear move to waypoint at constant feed rate, returning without waiting for arrival.
+
+        Arguments:
+            waypoint (dict): Target waypoint, e.g. {'z': '-9.500'}
+            feed (float): Feed rate, mm/min
+
+        Returns:
+            duration (float): Predicted seconds until arrival, or None if the kinematic model is unavailable.
+        """
+        start = self.reader.report['position'] if self.reader.report else self.position
+        self.send(self.move_command(waypoint).replace("G0", "G1", 1) + f" F{feed:.3f}")
         self.wait_for("ok")
-        return self.wait_waypoint(waypoint)
+        return self.estimate(start, waypoint, feed)
+
+    def at_rest(self, waypoint: dict, report: dict = None):
+        """Whether report (default: latest status report) shows the controller idle at waypoint."""
+        report = report or self.reader.report
+        return (
+            report is not None and report['state'] == self.idle_state and
+            waypoint.items() <= report['position'].items()
+        )
+
+    def position_at(self, timestamps, axis: str):
+        """Interpolates axis position at the given times from timestamped status reports.
+
+        Times outside the span of retained reports take the nearest report's position.
+        """
+        reports = list(self.reader.reports)
+        return np.interp(
+            timestamps,
+            [r['time'] for r in reports],
+            [float(r['position'][axis]) for r in reports]
+        )
 
     def jog(self, axis: str, ms_factor: int):
         """Incremental relative movement on given access.
@@ -124,14 +265,19 @@ class Controller:
         waypoint = self.update_position()
         waypoint[axis] = f"{float(waypoint[axis]) + steps:.3f}"
 
-        self.send(f"$J=G91{axis.upper()}{steps:.4f}F8000")
+        self.send(f"$J=G91{axis.upper()}{steps:.4f}F{self.jog_feed}")
         self.wait_for("ok")
-        return self.wait_waypoint(waypoint)
+        return self.wait_waypoint(waypoint, feed=self.jog_feed)
 
     def reset(self):
         self.send(f"\x18")
+
+        # Acknowledgements and alarms preceding the reset are no longer meaningful
+        for queue in (self.reader.acks, self.reader.alarms):
+            while not queue.empty():
+                queue.get_nowait()
+
         self.initialize(connect=False)
-        self.receive()
 
     def home(self):
         # Do individually in case we're underpowered
@@ -139,40 +285,103 @@ class Controller:
         # for motor in self.motors.values():
 
     def update_position(self):
-        # todo: describe behavior
-        self.send("?", send_linefeed=False)
-        message = self.receive()
+        """Requests an immediate status report and returns the position it contains."""
+        self.reader.query()
         try:
-            m = self.pos_pattern.search(message).groupdict()
-        except AttributeError:
-            raise ControllerException(f"Unexpected output while determining motor position: {message}")
-        else:
-            self.position.update(**{k: f"{float(v):.3f}" for k, v in m.items() if v is not None})
-        return m
+            report = self.reader.wait_report(timeout=self.timeout)
+        except TimeoutError:
+            raise ControllerException(f"Timeout while determining motor position")
+        self.position.update(report['position'])
+        return dict(report['position'])
 
     def wait_for(self, value, timeout=0):
+        """Blocks until the acknowledgement value is received.
+
+        Raises:
+            ControllerException: Controller responded with an error, or raised an alarm.
+            TimeoutError: Acknowledgement not received within timeout seconds, if non-zero.
+        """
         message = None
         timeout = time() + timeout if timeout else None
         while message != value:
+            try:
+                alarm = self.reader.alarms.get_nowait()
+            except Empty:
+                pass
+            else:
+                raise ControllerException(f"Controller alarm: {alarm}")
+
+            if not self.reader.is_alive():
+                raise ControllerException(f"Lost connection to controller")
+
             if timeout and time() >= timeout:
                 raise TimeoutError
-            message = self.receive()
 
-    def wait_waypoint(self, waypoint):
-        pos = self.update_position()
-        # todo: fix up float/string handling
-        dist = max(abs(float(pos[k]) - float(waypoint[k])) for k in waypoint)
-        # todo: refactor this magic constant
-        timeout = dist * self.est_step_time * 20
+            try:
+                message = self.reader.acks.get(timeout=self.status_interval)
+            except Empty:
+                continue
+
+            if message.startswith("error"):
+                raise ControllerException(f"Controller responded with {message}")
+
+    def estimate(self, start: dict, waypoint: dict, feed: float = None):
+        """Predicts seconds to move from start to waypoint, or None if the kinematic model is unavailable."""
+        if self.kinematics is None:
+            return None
+        return self.kinematics.duration(start, waypoint, feed)
+
+    def wait_waypoint(self, waypoint, feed: float = None):
+        """Blocks until a status report shows the controller idle at waypoint, returning distance travelled.
+
+        When the kinematic model is available, status is not queried until shortly before predicted arrival,
+        then every eta_poll seconds until arrival, and the timeout is proportional to the predicted duration.
+        The predicted arrival time is kept in eta.
+        """
         start = time()
-        while not waypoint.items() <= self.update_position().items():
-            if time() > start + timeout:
-                raise ControllerException(f"Waypoint timeout {timeout}s to {waypoint}, cur {self.update_position()}")
-            # Prevent flooding controller
-            sleep(self.est_step_time)
+        pos = self.reader.report['position'] if self.reader.report else self.position
+        # todo: fix up float/string handling
+        dist = max(abs(float(pos.get(k, 0)) - float(waypoint[k])) for k in waypoint)
+        duration = self.estimate(pos, waypoint, feed)
+
+        if duration is None:
+            # todo: refactor this magic constant
+            timeout = dist * self.est_step_time * 20 + self.status_interval * 2
+            poll = timeout
+        else:
+            timeout = duration * self.eta_tolerance + self.eta_margin
+            poll = self.eta_poll
+            self.eta = start + duration
+            self.reader.schedule(self.eta - self.eta_lead)
+
+        report = None
+        deadline = start + timeout
+        while report is None:
+            try:
+                report = self.reader.wait_report(
+                    lambda r: self.at_rest(waypoint, r), timeout=min(deadline - time(), poll)
+                )
+            except TimeoutError:
+                if time() >= deadline:
+                    raise ControllerException(
+                        f"Waypoint timeout {timeout:.3f}s to {waypoint}, cur {self.reader.report}"
+                    )
+                if duration is not None and time() >= self.eta - self.eta_lead:
+                    self.reader.query()
+
+        if duration is not None:
+            logger.debug(f"Arrived in {time() - start:.3f}s, predicted {duration:.3f}s")
+
+        self.position.update(report['position'])
         return dist
 
     def shutdown(self):
+        try:
+            self.reader.stop()
+        except AttributeError:
+            # Don't raise exception if reader is unset
+            pass
+
         try:
             self.serial.close()
         except AttributeError:
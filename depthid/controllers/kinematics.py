@@ -0,0 +1,82 @@
+import math
+
+
+class Kinematics:
+    """Trapezoidal move-time model matching Grbl's planner.
+
+    A move travels in a straight line, accelerating from rest at a constant rate to its cruise rate and
+    decelerating to rest at the target. As in Grbl, rate and acceleration along the line are limited so
+    that no axis exceeds its own maximum ($110-$112, mm/min and $120-$122, mm/sec^2) once projected onto
+    that axis. Short moves which cannot reach cruise rate follow a triangular profile.
+    """
+
+    axes = ('x', 'y', 'z')
+
+    def __init__(self, max_rates: list, accelerations: list):
+        """
+        Arguments:
+            max_rates (list): Maximum rate per axis, in mm/min.
+            accelerations (list): Acceleration per axis, in mm/sec^2.
+        """
+        self.max_rates = max_rates
+        self.accelerations = accelerations
+
+    @classmethod
+    def from_settings(cls, settings: dict):
+        """Creates model from Grbl settings keyed by number, e.g. {110: 500.0, ..., 122: 10.0}"""
+        return cls(
+            max_rates=[settings[110 + idx] for idx in range(len(cls.axes))],
+            accelerations=[settings[120 + idx] for idx in range(len(cls.axes))]
+        )
+
+    def profile(self, start: list, target: list, feed: float = None):
+        """Computes motion profile between start and target positions.
+
+        Arguments:
+            start (list): Start position per axis.
+            target (list): Target position per axis.
+            feed (float): Requested feed rate in mm/min, or None for rapid.
+
+        Returns:
+            profile (dict): delta, distance, rate (mm/sec), accel (mm/sec^2), ramp and duration (sec)
+        """
+        delta = [t - s for s, t in zip(start, target)]
+        distance = math.sqrt(sum(d ** 2 for d in delta))
+        rate, accel = float("inf"), float("inf")
+        for idx, d in enumerate(delta):
+            if d:
+                unit = abs(d) / distance
+                rate = min(rate, self.max_rates[idx] / 60 / unit)
+                accel = min(accel, self.accelerations[idx] / unit)
+        if feed:
+            rate = min(rate, feed / 60)
+
+        if not distance:
+            rate, ramp, cruise = 0.0, 0.0, 0.0
+        elif distance >= rate ** 2 / accel:
+            ramp, cruise = rate / accel, distance / rate - rate / accel
+        else:
+            ramp, cruise = math.sqrt(distance / accel), 0.0
+            rate = accel * ramp
+
+        return {
+            "delta": delta, "distance": distance, "rate": rate, "accel": accel, "ramp": ramp,
+            "duration": 2 * ramp + cruise
+        }
+
+    def duration(self, start: dict, target: dict, feed: float = None):
+        """Predicts seconds to move between waypoints, e.g. {'x': '1.000'}; axes absent from target hold."""
+        start_v = [float(start.get(axis, 0)) for axis in self.axes]
+        target_v = [float(target.get(axis, start_v[idx])) for idx, axis in enumerate(self.axes)]
+        return self.profile(start_v, target_v, feed)["duration"]
+
+    @staticmethod
+    def distance(profile: dict, t: float):
+        """Returns distance travelled along profile t seconds after the move began."""
+        t = min(max(t, 0), profile["duration"])
+        ramp, rate, accel = profile["ramp"], profile["rate"], profile["accel"]
+        if t < ramp:
+            return .5 * accel * t ** 2
+        elif t <= profile["duration"] - ramp:
+            return .5 * accel * ramp ** 2 + rate * (t - ramp)
+        return profile["distance"] - .5 * accel * (profile["duration"] - t) ** 2
@@ -1,20 +1,43 @@
+import re
+from time import sleep, time
+
 from .controller import Controller
 from .exception import ControllerException
 
 
 class Marlin(Controller):
     banner = "Marlin"
+    # M114 is acknowledged like any other command, so status is requested on demand rather than at a fixed rate
+    status_query = None
+    # M114 reply, e.g. 'X:10.00 Y:0.00 Z:0.00 E:0.00 Count X:800 Y:0 Z:0'; the first match is the position in mm
+    pos_pattern = re.compile(r"X:(?P<x>[\d.-]+) Y:(?P<y>[\d.-]+) Z:(?P<z>[\d.-]+)")
 
     def update_position(self):
         # todo: describe behavior
-        self.send("M114", send_linefeed=False)
-        message = self.receive()
-        message = self.receive()
-        message = self.receive()
-        try:
-            m = self.pos_pattern.search(message).groupdict()
-        except AttributeError:
-            raise ControllerException(f"Unexpected output while determining motor position: {message}")
-        else:
-            self.position.update(**{k: f"{float(v):.3f}" for k, v in m.items() if v is not None})
-        return m
\ No newline at end of file
+        self.send("M114")
+        message = ""
+        deadline = time() + self.timeout
+        while self.pos_pattern.search(message) is None:
+            try:
+                message = self.receive(timeout=deadline - time())
+            except TimeoutError:
+                raise ControllerException(f"Unexpected output while determining motor position: {message}")
+        self.wait_for("ok")
+
+        m = self.pos_pattern.search(message).groupdict()
+        self.position.update(**{k: f"{float(v):.3f}" for k, v in m.items() if v is not None})
+        return {k: f"{float(v):.3f}" for k, v in m.items() if v is not None}
+
+    def wait_waypoint(self, waypoint, feed: float = None):
+        pos = self.update_position()
+        # todo: fix up float/string handling
+        dist = max(abs(float(pos[k]) - float(waypoint[k])) for k in waypoint)
+        # todo: refactor this magic constant
+        timeout = dist * self.est_step_time * 20
+        start = time()
+        while not waypoint.items() <= self.update_position().items():
+            if time() > start + timeout:
+                raise ControllerException(f"Waypoint timeout {timeout}s to {waypoint}, cur {self.position}")
+            # Prevent flooding controller
+            sleep(self.est_step_time)
+        return dist
@@ -0,0 +1,159 @@
+import logging
+import re
+from collections import deque
+from queue import Queue
+from threading import Condition, Event, Lock, Thread
+from time import time
+
+from serial import SerialException
+
+
+logger = logging.getLogger("depthid")
+
+
+class Reader(Thread):
+    """Background thread which owns a controller's serial connection.
+
+    Incoming lines are demultiplexed by type:
+
+        acks:     'ok' and 'error:x' acknowledgements, in the order the acknowledged lines were sent
+        alarms:   'ALARM:x' lines
+        messages: everything else, e.g. the welcome banner, '[MSG:...]' feedback and '$$' settings
+        reports:  '<State|MPos:...>' status reports, parsed into dicts and kept in a bounded history
+
+    When a status query is given, it is written at a fixed rate so that status reports are pushed to
+    waiters rather than polled for. All writes to the serial connection must go through `write` so that
+    status queries are never interleaved within a line.
+    """
+
+    read_timeout = .005
+    report_history = 256
+    state_pattern = re.compile(r"^<(?P<state>[A-Za-z]+)")
+
+    def __init__(self, serial, pos_pattern, status_query: str = None, status_interval: float = .1):
+        """
+        Arguments:
+            serial (Serial): Open serial connection.
+            pos_pattern (Pattern): Regex with x, y, z groups used to extract position from status reports.
+            status_query (str): Real-time command requesting a status report, e.g. '?'. None disables queries.
+            status_interval (float): Seconds between status queries.
+        """
+        super().__init__(daemon=True)
+        self.serial = serial
+        self.serial.timeout = self.read_timeout
+        self.pos_pattern = pos_pattern
+        self.status_query = status_query
+        self.status_interval = status_interval
+        self.acks = Queue()
+        self.alarms = Queue()
+        self.messages = Queue()
+        self.reports = deque(maxlen=self.report_history)
+        self.report = None
+        self.reported = Condition()
+        self.lock = Lock()
+        self.running = Event()
+        self.next_query = 0
+
+    def run(self):
+        self.running.set()
+        buffer = bytearray()
+
+        while self.running.is_set():
+            if self.status_query and time() >= self.next_query:
+                self.query()
+
+            try:
+                buffer += self.serial.read(self.serial.in_waiting or 1)
+            except (SerialException, OSError, TypeError) as e:
+                # TypeError/OSError are raised by pyserial when the port is closed underneath the thread
+                if self.running.is_set():
+                    logger.error(f"Failed to receive message from controller: {e}")
+                    self.running.clear()
+                break
+
+            while b"\n" in buffer:
+                line, _, buffer = buffer.partition(b"\n")
+                self.dispatch(line)
+
+    def dispatch(self, line: bytes):
+        try:
+            message = line.decode().strip()
+        except UnicodeDecodeError as e:
+            logger.warning(f"Failed to decode {line} from controller: {e}")
+            return
+
+        if not message:
+            return
+
+        if message.startswith("<"):
+            self.receive_report(message)
+            return
+
+        logger.debug(f"Recv {message}")
+        if message == "ok" or message.startswith("error"):
+            self.acks.put(message)
+        elif message.startswith("ALARM"):
+            logger.error(f"Controller alarm: {message}")
+            self.alarms.put(message)
+        else:
+            self.messages.put(message)
+
+    def receive_report(self, message: str):
+        try:
+            state = self.state_pattern.search(message).group("state")
+            pos = self.pos_pattern.search(message).groupdict()
+        except AttributeError:
+            logger.warning(f"Unexpected status report from controller: {message}")
+            return
+
+        report = {
+            # Receipt time less transmission time approximates when the report was generated
+            "time": time() - (len(message) + 2) * 10 / self.serial.baudrate,
+            "state": state,
+            "position": {k: f"{float(v):.3f}" for k, v in pos.items() if v is not None}
+        }
+        with self.reported:
+            self.report = report
+            self.reports.append(report)
+            self.reported.notify_all()
+
+    def write(self, data: bytes):
+        with self.lock:
+            self.serial.write(data)
+            self.serial.flush()
+
+    def query(self):
+        """Requests a status report immediately, resetting the fixed-rate schedule."""
+        self.next_query = time() + self.status_interval
+        try:
+            self.write(self.status_query.encode())
+        except SerialException as e:
+            logger.error(f"Failed to query controller status: {e}")
+
+    def schedule(self, at: float):
+        """Defers the next status query until the given time."""
+        self.next_query = at
+
+    def wait_report(self, predicate=None, timeout: float = None):
+        """Blocks until a status report arriving after the call satisfies predicate, returning the report.
+
+        Raises:
+            TimeoutError: No matching report arrived within timeout seconds.
+        """
+        deadline = time() + timeout if timeout is not None else None
+        seen = self.report
+        with self.reported:
+            while True:
+                if self.report is not seen:
+                    seen = self.report
+                    if predicate is None or predicate(seen):
+                        return seen
+                remaining = deadline - time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError
+                self.reported.wait(remaining)
+
+    def stop(self):
+        self.running.clear()
+        if self.is_alive():
+            self.join()
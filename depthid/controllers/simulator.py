@@ -0,0 +1,328 @@
+import argparse
+import logging
+import os
+import re
+import select
+import tty
+from collections import deque
+from queue import Queue
+from threading import Condition, Event, Thread
+from time import sleep, time
+
+from .kinematics import Kinematics
+
+logger = logging.getLogger("depthid")
+
+
+class Simulator:
+    """Simulated Grbl 1.1f device served over a Linux pseudo-terminal.
+
+    Controllers connect to `device_name` as they would to a real device. On each connection the welcome
+    banner is emitted, after which the simulator:
+
+        - acknowledges '$x=val' settings and lists them in response to '$$'
+        - executes G0/G1 moves and '$J=' jogs with trapezoidal timing from $110-$112 max rates and
+          $120-$122 accelerations, queueing up to `planner_size` moves as Grbl's planner does
+        - holds G4 dwell acknowledgements until queued motion has completed, then for the dwell period
+        - answers '?' with '<State|MPos:x,y,z|FS:feed,0>' reports interpolated along the current move
+        - handles 0x18 soft reset and 0x85 jog cancel
+        - answers M114 with a Marlin-style position, so that Marlin controllers may also connect
+
+    Moves start and end at rest; junction blending between consecutive moves is not modelled. Distance
+    travelled and time spent in motion are accumulated in `distance` and `motion_time`, and the number of
+    times the host exceeded the RX buffer is counted in `overflows`.
+    """
+
+    banner = "Grbl 1.1f ['$' for help]"
+    planner_size = 15
+    rx_buffer_size = 128
+    axes = ('x', 'y', 'z')
+    word_pattern = re.compile(r"([A-Z])([-+]?[\d.]+)")
+    settings = {
+        0: 10.0, 1: 25.0, 2: 0.0, 3: 0.0, 4: 0.0, 5: 0.0, 6: 0.0, 10: 1.0, 11: 0.010, 12: 0.002, 13: 0.0,
+        20: 0.0, 21: 0.0, 22: 0.0, 23: 0.0, 24: 25.0, 25: 500.0, 26: 250.0, 27: 1.0, 30: 1000.0, 31: 0.0,
+        32: 0.0, 100: 250.0, 101: 250.0, 102: 250.0, 110: 500.0, 111: 500.0, 112: 500.0, 120: 10.0,
+        121: 10.0, 122: 10.0, 130: 200.0, 131: 200.0, 132: 200.0
+    }
+
+    def __init__(self, settings: dict = None, banner: str = None, reset_delay: float = .05):
+        """
+        Arguments:
+            settings (dict): Overrides for Grbl '$' settings, keyed by number, e.g. {110: 8000}
+            banner (str): Welcome banner emitted on connection and reset.
+            reset_delay (float): Seconds between connection and banner, mimicking Grbl's boot.
+        """
+        self.settings = dict(self.settings)
+        self.settings.update(settings or {})
+        self.banner = banner or self.banner
+        self.reset_delay = reset_delay
+        self.master = None
+        self.device_name = None
+        self.position = [0.0] * len(self.axes)
+        self.planner = deque()
+        self.block = None
+        self.planned = Condition()
+        self.lines = Queue()
+        self.buffered = 0
+        self.overflows = 0
+        self.distance = 0.0
+        self.motion_time = 0.0
+        self.running = Event()
+        self.threads = []
+
+    def start(self):
+        """Opens pseudo-terminal and starts serving, returning device name for controllers to connect to."""
+        self.master, slave = os.openpty()
+        # Raw mode prevents the line discipline from echoing responses back as commands
+        tty.setraw(slave)
+        self.device_name = os.ttyname(slave)
+        os.close(slave)
+        # Reads must not block, so that serving stops promptly
+        os.set_blocking(self.master, False)
+
+        self.running.set()
+        self.threads = [Thread(target=f, daemon=True) for f in (self.serve, self.execute, self.move)]
+        for thread in self.threads:
+            thread.start()
+
+        logger.info(f"Simulated Grbl serving on {self.device_name}")
+        return self.device_name
+
+    def stop(self):
+        self.running.clear()
+        self.lines.put(None)
+        with self.planned:
+            self.planned.notify_all()
+        for thread in self.threads:
+            thread.join()
+        os.close(self.master)
+
+    def write(self, message: str):
+        try:
+            os.write(self.master, f"{message}\r\n".encode())
+        except OSError:
+            # Controller disconnected
+            pass
+
+    def serve(self):
+        """Reads from the pseudo-terminal, handling real-time commands and queueing lines for execution."""
+        connected = False
+        buffer = bytearray()
+
+        while self.running.is_set():
+            if not select.select([self.master], [], [], .01)[0]:
+                if not connected:
+                    # Reads fail with EIO until a controller opens the device
+                    connected = True
+                    sleep(self.reset_delay)
+                    self.reset()
+                continue
+
+            try:
+                data = os.read(self.master, 1024)
+            except BlockingIOError:
+                continue
+            except OSError:
+                # No controller connected
+                connected = False
+                sleep(.01)
+                continue
+
+            if not connected:
+                connected = True
+                self.reset()
+
+            for char in data:
+                if char == ord("?"):
+                    self.write(self.report())
+                elif char == 0x18:
+                    buffer.clear()
+                    self.reset()
+                elif char == 0x85:
+                    self.cancel_jog()
+                elif char == ord("\n"):
+                    line = buffer.decode(errors="replace")
+                    self.buffered += len(buffer) + 1
+                    if self.buffered > self.rx_buffer_size:
+                        self.overflows += 1
+                        logger.warning(f"Simulated Grbl RX buffer overflow, {self.buffered} bytes")
+                    self.lines.put(line)
+                    buffer.clear()
+                elif char != ord("\r"):
+                    buffer.append(char)
+
+    def reset(self):
+        with self.planned:
+            for block in self.planner:
+                block["cancelled"] = True
+            self.planner.clear()
+            self.block = None
+            self.planned.notify_all()
+        while not self.lines.empty():
+            self.lines.get_nowait()
+        self.buffered = 0
+        self.write("")
+        self.write(self.banner)
+
+    def acknowledge(self, line: str, message: str = "ok"):
+        self.buffered = max(0, self.buffered - len(line) - 1)
+        self.write(message)
+
+    def execute(self):
+        """Parses and executes queued lines in order, as Grbl's protocol loop does."""
+        while self.running.is_set():
+            line = self.lines.get()
+            if line is None:
+                break
+
+            # Grbl ignores whitespace and case
+            block = line.replace(" ", "").upper()
+            try:
+                response = self.parse(block)
+            except (ValueError, KeyError):
+                response = "error:2"
+
+            if isinstance(response, list):
+                for message in response[:-1]:
+                    self.write(message)
+                response = response[-1]
+            self.acknowledge(line, response)
+
+    def parse(self, block: str):
+        if not block:
+            return "ok"
+        elif block == "$$":
+            return [f"${k}={v:.3f}" for k, v in sorted(self.settings.items())] + ["ok"]
+        elif block.startswith("$J="):
+            return self.plan(block[3:], jog=True)
+        elif block.startswith("$"):
+            key, value = block[1:].split("=")
+            self.settings[int(key)] = float(value)
+            return "ok"
+        elif block == "M114":
+            x, y, z = self.current_position()
+            return [f"X:{x:.2f} Y:{y:.2f} Z:{z:.2f} E:0.00 Count X:0 Y:0 Z:0", "ok"]
+
+        # Machine coordinates and absolute positioning are assumed unless G91 is given
+        block = block.replace("G53", "").replace("G90", "")
+        words = dict(self.word_pattern.findall(block))
+        if block.startswith("G4"):
+            self.synchronize()
+            sleep(float(words.get("P", 0)))
+            return "ok"
+        elif block.startswith(("G0", "G1", "G91", "X", "Y", "Z")):
+            return self.plan(block, rapid=block.startswith(("G0", "G91G0")))
+        # Unsupported g-code is accepted without effect
+        return "ok"
+
+    def plan(self, block: str, jog: bool = False, rapid: bool = False):
+        words = dict(self.word_pattern.findall(block))
+        incremental = "G91" in block
+        with self.planned:
+            while len(self.planner) >= self.planner_size and self.running.is_set():
+                self.planned.wait()
+            start = self.planner[-1]["target"] if self.planner else self.end_position()
+            target = [
+                (start[i] if incremental else 0) + float(words[axis.upper()]) if axis.upper() in words else start[i]
+                for i, axis in enumerate(self.axes)
+            ]
+            feed = float(words["F"]) if "F" in words and not rapid else None
+            block = Kinematics.from_settings(self.settings).profile(start, target, feed)
+            block.update(start=start, target=target, state="Jog" if jog else "Run", time=None)
+            self.planner.append(block)
+            self.planned.notify_all()
+        return "ok"
+
+    def move(self):
+        """Executes planned blocks one after another in real time."""
+        while self.running.is_set():
+            with self.planned:
+                while not self.planner and self.running.is_set():
+                    self.planned.wait()
+                if not self.running.is_set():
+                    break
+                block = self.planner[0]
+                block["time"] = time()
+                self.block = block
+
+            cancelled = block.get("cancelled")
+            while time() - block["time"] < block["duration"] and not cancelled and self.running.is_set():
+                sleep(min(.005, block["duration"]))
+                cancelled = block.get("cancelled")
+
+            with self.planned:
+                if self.block is block:
+                    self.position = self.interpolate(block, time()) if cancelled else list(block["target"])
+                    self.distance += block["distance"]
+                    self.motion_time += min(time() - block["time"], block["duration"])
+                    self.block = None
+                if self.planner and self.planner[0] is block:
+                    self.planner.popleft()
+                self.planned.notify_all()
+
+    def synchronize(self):
+        with self.planned:
+            while (self.planner or self.block) and self.running.is_set():
+                self.planned.wait()
+
+    def cancel_jog(self):
+        with self.planned:
+            if self.block is not None and self.block["state"] == "Jog":
+                self.block["cancelled"] = True
+            jogs = [b for b in self.planner if b["state"] == "Jog" and b is not self.block]
+            for block in jogs:
+                self.planner.remove(block)
+            self.planned.notify_all()
+
+    def interpolate(self, block: dict, now: float):
+        s = Kinematics.distance(block, now - block["time"])
+        f = s / block["distance"] if block["distance"] else 1
+        return [s0 + d * f for s0, d in zip(block["start"], block["delta"])]
+
+    def end_position(self):
+        return list(self.block["target"]) if self.block else list(self.position)
+
+    def current_position(self):
+        with self.planned:
+            return self.interpolate(self.block, time()) if self.block else list(self.position)
+
+    def report(self):
+        with self.planned:
+            block = self.block
+            position = self.interpolate(block, time()) if block else self.position
+        state = block["state"] if block else "Idle"
+        feed = block["rate"] * 60 if block else 0
+        return f"<{state}|MPos:{','.join(f'{p:.3f}' for p in position)}|FS:{feed:.0f},0>"
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s [%(levelname)-5.5s] %(message)s", level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        prog="python -m depthid.controllers.simulator",
+        description="Serve a simulated Grbl device; use the printed device name as the controller's device_name."
+    )
+    parser.add_argument('--banner', default=Simulator.banner, help='Welcome banner, e.g. "Marlin"')
+    parser.add_argument('--max-rate', type=float, help='$110-$112 max rate, mm/min')
+    parser.add_argument('--acceleration', type=float, help='$120-$122 acceleration, mm/sec^2')
+    args = parser.parse_args()
+
+    overrides = {}
+    for base, value in ((110, args.max_rate), (120, args.acceleration)):
+        if value is not None:
+            overrides.update({base + idx: value for idx in range(3)})
+
+    with Simulator(settings=overrides, banner=args.banner) as simulator:
+        try:
+            simulator.running.wait()
+            while simulator.running.is_set():
+                sleep(1)
+        except KeyboardInterrupt:
+            logger.info(f"Travelled {simulator.distance:.3f}mm, {simulator.overflows} RX buffer overflows")
@@ -2,15 +2,29 @@ import errno
 import json
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import partial
+from itertools import count
+from threading import BoundedSemaphore, Lock, local
 from time import time
 
+import numpy as np
+
 from depthid import pipeline as p
-from depthid.cameras import Camera, CameraException, OpenCV, Spinnaker, load_camera
+from depthid.cameras import Camera, CameraException, Frame, OpenCV, Synthetic, load_camera
+from depthid.cameras.packing import packed_formats, unpack
+from depthid.container import CONTAINER, ContainerWriter
 from depthid.controllers import Controller, ControllerException, load_controller
+from depthid.pipeline.buffers import BufferPool, expire
+from depthid.pipeline.compiler import CAMERA, SKIPPED, active, compile_pipeline
+from depthid.pipeline.macro import expand
+from depthid.pipeline.scheduler import Scheduler
+from depthid.profiler import Profiler
 from depthid.sequence import Sequence
 from depthid.ui.cv import UI as CVUI
 from depthid.util import pathify, to_csv
+from depthid.writer import Writer
 
 
 logger = logging.getLogger("depthid")
@@ -24,7 +38,13 @@ class Job:
 
     def __init__(self, name: str, path: str, controller: Controller, camera: Camera, pipeline: dict, parameters: str,
                  csv_filename: str = None, sequence_parameters: str = None, coordinates: list = None,
-                 mode: str = "automatic", full_screen: bool = True, save_formats: list = None):
+                 mode: str = "automatic", full_screen: bool = True, save_formats: list = None,
+                 streaming: bool = False, dwell: float = 0.0, ordering: str = None, fixed_axis: str = None,
+                 pipelined: bool = False, max_in_flight: int = 2, workers: int = 1, frame_rate: float = 10.0,
+                 frames_per_plane: int = 2, plane_tolerance: float = None, plane_policy: str = "nearest",
+                 step_workers: int = 1, reuse_buffers: bool = True, profile: bool = False,
+                 profile_window: int = 500, macros: dict = None, save_statistics: bool = False,
+                 save_workers: int = 2, save_queue: int = 8):
 
         self.start_time = datetime.now()
         self.name = f"{name}_{self.start_time.isoformat().replace(':', '')}"
@@ -32,18 +52,47 @@ class Job:
         self.path = pathify(path)
         self.session_directory = f"{self.path}/{self.name}"
         self.save_formats = save_formats or ["raw"]
+        self.save_statistics = save_statistics
+        self.statistics_fh = None
+        self.save_workers = save_workers
+        self.save_queue = save_queue
+        self.writer = None
+        self.container = None
+        self.histogram_name = None
         self.parameters = parameters
         self.controller = controller
         self.camera = camera
         self.pipeline = pipeline
+        self.macros = macros
+        self.steps = []
+        self.frame_ctr = count()
+        self.scheduler = None
+        self.step_workers = step_workers
+        self.reuse_buffers = reuse_buffers
+        self.buffers = BufferPool()
+        self.profile = profile
+        self.profile_window = profile_window
+        self.profiler = None
         self.pipeline_t = ""
+        self.streaming = streaming
+        self.dwell = dwell
+        self.pipelined = pipelined
+        self.max_in_flight = max_in_flight
+        self.workers = workers
+        self.frame_rate = frame_rate
+        self.frames_per_plane = frames_per_plane
+        self.plane_tolerance = plane_tolerance
+        self.plane_policy = plane_policy
 
         # todo: consider pushing this out to main
         self.ui = CVUI(camera=camera, controller=controller, job=self, full_screen=full_screen)
 
         self.save_ctr = 0
+        self.save_lock = Lock()
         self.move_ctr = 0
         self.last_waypoint = None
+        # Waypoint of the frame being processed by the current thread, when pipelined
+        self.frame = local()
 
         if csv_filename:
             self.sequence = Sequence.load_csv(csv_filename)
@@ -56,6 +105,16 @@ class Job:
         else:
             raise JobException("Either CSV filename, sequence, coordinates, or interactive mode must be provided")
 
+        if ordering:
+            try:
+                sequence = self.sequence.reorder(ordering, fixed_axis)
+            except ValueError as e:
+                raise JobException(e)
+            logger.info(
+                f"Reordered waypoints {ordering}, travel {self.sequence.distance:.3f} -> {sequence.distance:.3f}"
+            )
+            self.sequence = sequence
+
         if self.sequence:
             logger.info(f"Defined {len(self.sequence)} waypoints")
 
@@ -75,6 +134,27 @@ class Job:
         )
 
     def initialize(self):
+        # Resolve pipeline before starting hardware, so that configuration errors fail fast
+        modules = {name: getattr(p, name) for name in p.__all__}
+        modules.update(ui=self.ui, job=self)
+        try:
+            pipeline = expand(self.pipeline, self.macros)
+            self.steps = compile_pipeline(pipeline, modules, self.camera)
+        except ValueError as e:
+            logger.error(f"Invalid pipeline: {e}")
+            raise JobException
+        # The status panel shows statistics of the first histogram step, stored under its name
+        self.histogram_name = next(
+            (
+                step.get('kw', {}).get('name', "1") for step in pipeline
+                if step.get('f') == "histogram" and step.get('m') in ("stats", "opencv", "numpy")
+            ),
+            None
+        )
+        if self.step_workers > 1:
+            self.scheduler = Scheduler(self.steps, self.step_workers)
+            logger.info(f"Scheduling independent pipeline steps on {self.step_workers} workers")
+
         # Create target directory, if doesn't already exist
         try:
             os.makedirs(self.session_directory)
@@ -82,6 +162,15 @@ class Job:
             if e.errno != errno.EEXIST:
                 raise JobException(f"Unable to create image directory {self.session_directory}: {e}")
 
+        self.profiler = Profiler(
+            self.steps, self.camera, pool=self.buffers, window=self.profile_window,
+            filename=f"{self.session_directory}/profile.jsonl" if self.profile else None
+        )
+        if self.save_statistics:
+            self.statistics_fh = open(f"{self.session_directory}/statistics.jsonl", "a")
+        if self.save_workers > 0:
+            self.writer = Writer(workers=self.save_workers, queue_size=self.save_queue)
+
         try:
             self.controller.initialize()
         except ControllerException as e:
@@ -90,6 +179,10 @@ class Job:
         else:
             logger.info(f"{self.controller} initialized")
 
+        if isinstance(self.camera, Synthetic):
+            # Defocus follows controller z
+            self.camera.controller = self.controller
+
         try:
             self.camera.initialize()
         except CameraException as e:
@@ -98,10 +191,6 @@ class Job:
         else:
             logger.info(f"{self.camera} initialized")
 
-        # Bind ui instance to pipeline module so that ui can be referenced at runtime
-        p.ui = self.ui
-        p.job = self
-
         self.save_parameters()
 
     def run(self):
@@ -113,65 +202,327 @@ class Job:
             except (CameraException, ControllerException) as e:
                 logger.error(e)
                 raise JobException
+        elif self.mode == "continuous":
+            self.continuous()
         else:
             self.automatic()
 
-    def do_pipeline(self):
-        stack = [None] * len(self.pipeline)
-        for idx, step in enumerate(self.pipeline):
-            start = time()
-
-            # User is asked to specify "camera" for i val, which raises TypeError
-            # allowing us to inject the dependency
-            try:
-                i = stack[step['i']]
-            except KeyError:
-                i = None
-            except TypeError:
-                # todo: this is fragile, think of a better way to generalize
-                i = self.camera.camera
+    def do_pipeline(self, stack: list = None, start_idx: int = 0, stop_idx: int = None, sample: dict = None):
+        """Runs pipeline steps from start_idx up to stop_idx, returning stack of step outputs.
+
+        A stack from a previous partial run may be given to continue it; otherwise a frame begins, and steps
+        which do not run on it are marked skipped. Each output is dropped once the steps
+        reading it have run, returning its buffer to the pool. Once the final step has run, frames in the stack
+        are released to the camera driver. With step_workers, steps run concurrently as their inputs become
+        available. Step durations are recorded by the profiler, and added to the waypoint's sample if given.
+        """
+        if stack is None:
+            frame = next(self.frame_ctr)
+            stack = [None if run else SKIPPED for run in active(self.steps, frame)]
+        if self.scheduler:
+            # Workers see the waypoint of the frame being processed by this thread
+            waypoint = getattr(self.frame, "waypoint", self.last_waypoint)
+            self.scheduler.run(
+                stack, start_idx, stop_idx, prepare=lambda: setattr(self.frame, "waypoint", waypoint),
+                record=lambda step, seconds, data: self.profiler.record(step, seconds, data, sample),
+                pool=self.buffers, reuse=self.reuse_buffers
+            )
+        else:
+            pool = self.buffers if self.reuse_buffers else None
+            for step in self.steps[start_idx:stop_idx]:
+                if stack[step.idx] is not SKIPPED:
+                    seconds = step.run(stack, pool)
+                    self.profiler.record(step, seconds, stack[step.idx], sample)
+                expire(stack, step, self.steps, range(step.idx + 1), self.buffers)
 
-            fn = getattr(getattr(p, step['m']), step['f'])
+        self.pipeline_t = ", ".join([f"{step.time:.3f}" for step in self.steps])
 
-            if i is not None:
-                stack[idx] = fn(i, **step.get("kw", {}))
-            else:
-                stack[idx] = fn(**step.get("kw", {}))
+        if stop_idx is None or stop_idx >= len(self.steps):
+            self.release(stack)
+        return stack
 
-            self.pipeline[idx]["time"] = time() - start
+    @staticmethod
+    def release(stack: list):
+        for data in stack:
+            if isinstance(data, Frame):
+                data.release()
 
-        self.pipeline_t = ", ".join([f"{v['time']:.3f}" for v in self.pipeline])
+    @property
+    def acquisition_steps(self):
+        """Number of leading pipeline steps which must run at the waypoint, through the last camera step."""
+        return max((step.idx for step in self.steps if step.source == CAMERA), default=-1) + 1
+
+    def process(self, stack: list, waypoint: dict, sample: dict = None):
+        self.frame.waypoint = waypoint
+        sample = sample or self.profiler.sample()
+        stack = self.do_pipeline(stack, start_idx=self.acquisition_steps, sample=sample)
+        self.profiler.commit(sample, waypoint)
         return stack
 
     def save(self, data, formats=None, pos=None):
         # todo: improve var passing in pipeline so pos can be passed more easily
-        pos = pos if pos is not None else self.last_waypoint
+        pos = pos if pos is not None else getattr(self.frame, "waypoint", self.last_waypoint)
 
+        # todo: have this behavior expressed via the camera class
+        write = p.opencv.save if isinstance(self.camera, OpenCV) else p.spinnaker.save
+        saves = []
         for fmt in formats or self.save_formats:
-            fn = f"{self.session_directory}/{self.save_ctr}_{to_csv(pos)}.{fmt}"
+            with self.save_lock:
+                if fmt == CONTAINER:
+                    if self.container is None:
+                        self.container = ContainerWriter(f"{self.session_directory}/session.{CONTAINER}")
+                    settings = self.camera.settings
+                    # A copy, as the position may be the controller's, which changes before the frame is written
+                    store = partial(
+                        self.store, waypoint=dict(pos), timestamp=time(),
+                        exposure_us=settings.get("ExposureTime", np.nan), gain_db=settings.get("Gain", np.nan)
+                    )
+                    saves.append((store, self.container.path))
+                    continue
+                saves.append((write, f"{self.session_directory}/{self.save_ctr}_{to_csv(pos)}.{fmt}"))
+                self.save_ctr += 1
+
+        if self.statistics_fh:
+            # Computed alongside the saves, off the acquiring thread where the writer is enabled
+            files = [os.path.basename(fn) for _, fn in saves]
+            saves.append((partial(self.write_statistics, files=files, waypoint=dict(pos)), self.statistics_fh.name))
+
+        if self.writer:
+            data, done = self.hold(data)
+            self.writer.write(data, saves, done)
+            return
+
+        for save, fn in saves:
+            save(data, fn)
+            logger.info(f"Saved {fn}")
 
-            # todo: have this behavior expressed via the camera class
-            if isinstance(self.camera, Spinnaker):
-                p.spinnaker.save(data, fn)
-            elif isinstance(self.camera, OpenCV):
-                p.opencv.save(data, fn)
+    def store(self, data, filename: str, waypoint: dict, timestamp: float, exposure_us: float,
+              gain_db: float) -> int:
+        """Appends frame to the session container, returning the number of bytes written."""
+        array = data if isinstance(data, np.ndarray) else data.GetNDArray()
+        return self.container.append(array, waypoint, timestamp, exposure_us, gain_db)
+
+    def write_statistics(self, data, filename: str, files: list, waypoint: dict) -> int:
+        """Appends statistics of the saved frame's pixels to the statistics file, returning the bytes written."""
+        line = json.dumps(dict(p.stats.statistics(self.pixels(data)).as_dict(), files=files, waypoint=waypoint))
+        with self.save_lock:
+            self.statistics_fh.write(line + "\n")
+        return len(line) + 1
+
+    @staticmethod
+    def pixels(data) -> np.ndarray:
+        """Returns the pixels of an image or frame as an ndarray, unpacking packed pixel formats."""
+        if isinstance(data, np.ndarray):
+            return data
+        pixel_format = data.GetPixelFormatName()
+        if pixel_format in packed_formats:
+            return unpack(data.GetData(), pixel_format, (data.GetHeight(), data.GetWidth()))
+        return data.GetNDArray()
+
+    @staticmethod
+    def hold(data):
+        """Returns data which remains valid after the pipeline completes, and a callable releasing it.
+
+        Frames are retained, so that the driver buffer is written without copying. Arrays are copied, as they
+        may be views of frames, or buffers reused by the pipeline or ui.
+        """
+        if isinstance(data, Frame):
+            return data.retain(), data.release
+        if isinstance(data, np.ndarray):
+            return data.copy(), None
+        return data, None
+
+    def waypoints(self):
+        for waypoint in self.sequence:
+            # todo: temporary conversion until sequence class is refactored to dicts
+            yield {axis: f"{pos:.3f}" for axis, pos in waypoint if pos not in (None, '')}
 
-            self.save_ctr += 1
-            logger.info(f"Saved {fn}")
+    def visit(self, waypoints):
+        for waypoint in waypoints:
+            self.controller.move(waypoint)
+            yield waypoint
+
+    @staticmethod
+    def timed(arrivals):
+        """Yields each waypoint of arrivals with the seconds spent waiting for it."""
+        arrivals = iter(arrivals)
+        while True:
+            start = time()
+            try:
+                waypoint = next(arrivals)
+            except StopIteration:
+                return
+            yield waypoint, time() - start
 
     def automatic(self):
         logger.info("Automatic mode enabled")
 
-        for waypoint in self.sequence:
-            # todo: temporary conversion until sequence class is refactored to dicts
-            waypoint = {axis: f"{pos:.3f}" for axis, pos in waypoint if pos not in (None, '')}
+        if self.streaming:
+            logger.info(f"Streaming waypoints, {self.dwell}s dwell")
+            arrivals = self.controller.stream(self.waypoints(), dwell=self.dwell)
+        else:
+            arrivals = self.visit(self.waypoints())
 
-            self.controller.move(waypoint)
+        if self.pipelined:
+            self.overlap(arrivals)
+        else:
+            for waypoint, move in self.timed(arrivals):
+                self.last_waypoint = waypoint
+                self.camera.arrival = time()
+                self.move_ctr += 1
+                sample = self.profiler.sample(move=move)
+                self.do_pipeline(sample=sample)
+                self.profiler.commit(sample, waypoint)
+                self.ui.refresh(wait_key=True)
+                logger.info(f"{self.status()}, {to_csv(waypoint)}")
+
+        logger.info(f"Returning to home 0,0,0")
+        self.controller.move({'x': '0.000', 'y': '0.000', 'z': '0.000'})
+
+    def overlap(self, arrivals):
+        """Moves to the next waypoint as soon as a frame is acquired, processing frames on worker threads.
+
+        Acquisition steps run at each waypoint; the remaining steps run on a pool of workers while the stage
+        travels. At most max_in_flight frames are acquired but not yet processed, bounding memory.
+        """
+        logger.info(f"Pipelined, {self.max_in_flight} frames in flight on {self.workers} workers")
+        slots = BoundedSemaphore(self.max_in_flight)
+        pending = []
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for waypoint, move in self.timed(arrivals):
+                self.last_waypoint = waypoint
+                self.camera.arrival = time()
+                self.move_ctr += 1
+
+                slots.acquire()
+                sample = self.profiler.sample(move=move)
+                stack = self.do_pipeline(stop_idx=self.acquisition_steps, sample=sample)
+                future = executor.submit(self.process, stack, waypoint, sample)
+                future.add_done_callback(lambda _: slots.release())
+                pending.append(future)
+
+                # Surface worker exceptions before the next move
+                for future in [f for f in pending if f.done()]:
+                    pending.remove(future)
+                    future.result()
+
+                self.ui.refresh(wait_key=True)
+                logger.info(f"{self.status()}, {to_csv(waypoint)}")
+
+            for future in pending:
+                future.result()
+
+    def continuous(self):
+        """Acquires a z-stack while z travels at constant feed, tagging frames with interpolated z position.
+
+        Waypoints must differ only in z, and are treated as the requested planes. Feed is set so that
+        frames_per_plane frames are captured per plane spacing at frame_rate. Each frame is timestamped on
+        arrival from a threaded camera, otherwise at the midpoint of its capture, and its z
+        interpolated from timestamped status reports.
+        Frames further than plane_tolerance (default: a quarter of the spacing) from every plane are
+        dropped. With plane_policy "bin" every frame within tolerance runs the remaining pipeline steps as
+        soon as it is placed. With "nearest" only the frame nearest each plane is kept, replaced while a
+        nearer one arrives, and runs the remaining steps once the sweep has passed the plane beyond
+        tolerance, so that at most a frame per plane in reach is held.
+        """
+        logger.info("Continuous mode enabled")
+
+        waypoints = list(self.waypoints())
+        planes = np.array([float(w.get('z', 0)) for w in waypoints])
+        steps = np.diff(planes)
+        lateral = [{k: v for k, v in w.items() if k != 'z'} for w in waypoints]
+        if any(other != lateral[0] for other in lateral):
+            raise JobException("Continuous mode requires waypoints which differ only in z")
+        if len(planes) < 2 or not (np.all(steps > 0) or np.all(steps < 0)):
+            raise JobException("Continuous mode requires at least two planes in ascending or descending z")
+        if self.plane_policy not in ("nearest", "bin"):
+            raise JobException(f"Unknown plane policy {self.plane_policy}, expected nearest or bin")
+
+        spacing = float(np.median(np.abs(steps)))
+        tolerance = self.plane_tolerance if self.plane_tolerance is not None else spacing / 4
+        feed = spacing * self.frame_rate / self.frames_per_plane * 60
+        start, stop = waypoints[0], waypoints[-1]
+
+        self.controller.move(start)
+        duration = self.controller.sweep(stop, feed)
+        logger.info(f"Sweeping z at {feed:.3f}mm/min over {len(planes)} planes, {spacing:.3f}mm apart")
+        if duration is None:
+            duration = abs(planes[-1] - planes[0]) / feed * 60
+        deadline = time() + duration * self.controller.eta_tolerance + self.controller.eta_margin
+
+        # plane index -> (error, z, stack) of its nearest frame so far
+        candidates = {}
+        direction = np.sign(planes[-1] - planes[0])
+        pending = []
+        captured, dropped, acquired = 0, 0, set()
+
+        def keep(idx, error, pos, stack):
+            waypoint = dict(start, z=f"{pos:.3f}")
             self.last_waypoint = waypoint
             self.move_ctr += 1
-            self.do_pipeline()
+            self.process(stack, waypoint)
+            acquired.add(idx)
             self.ui.refresh(wait_key=True)
-            logger.info(f"{self.status()}, {to_csv(waypoint)}")
+            logger.info(f"{self.status()}, {to_csv(waypoint)}, plane {planes[idx]:.3f} error {error:.3f}")
+
+        def resolve(frames):
+            nonlocal dropped
+            z = self.controller.position_at([t for t, _ in frames], 'z')
+            for (_, stack), pos in zip(frames, z):
+                idx = int(np.abs(planes - pos).argmin())
+                error = abs(planes[idx] - pos)
+                if error > tolerance:
+                    dropped += 1
+                    self.release(stack)
+                elif self.plane_policy == "bin":
+                    keep(idx, error, pos, stack)
+                elif idx not in candidates or error < candidates[idx][0]:
+                    if idx in candidates:
+                        dropped += 1
+                        self.release(candidates[idx][2])
+                    candidates[idx] = (error, pos, stack)
+                else:
+                    dropped += 1
+                    self.release(stack)
+
+                # No nearer frame can arrive for planes the sweep has passed beyond tolerance
+                for passed in [i for i in candidates if (pos - planes[i]) * direction > tolerance]:
+                    keep(passed, *candidates.pop(passed))
+
+        arrived, timestamp = None, 0.0
+        while True:
+            if arrived is None and self.controller.at_rest(stop):
+                arrived = time()
+            # A threaded camera's queue lags acquisition, so consume frames until one postdates arrival
+            if arrived is not None and (not self.camera.threaded or timestamp >= arrived):
+                break
+            if time() > deadline:
+                raise JobException(f"Timeout while sweeping to {to_csv(stop)}")
+
+            stack = self.do_pipeline(stop_idx=self.acquisition_steps)
+            # Unthreaded, the midpoint of the capture itself, excluding the capture step's settle waits
+            timestamp = self.camera.timestamp
+            if not self.camera.threaded:
+                timestamp -= self.camera.capture_time / 2
+            pending.append((timestamp, stack))
+            captured += 1
+
+            # Frames can be placed once a later status report brackets them
+            report = self.controller.reader.report
+            ready = [f for f in pending if f[0] <= report['time']]
+            if ready:
+                resolve(ready)
+                pending = pending[len(ready):]
+
+        if pending:
+            resolve(pending)
+        for idx in sorted(candidates):
+            keep(idx, *candidates.pop(idx))
+
+        logger.info(
+            f"Captured {captured} frames, {dropped} dropped, {len(acquired)}/{len(planes)} planes acquired"
+        )
 
         logger.info(f"Returning to home 0,0,0")
         self.controller.move({'x': '0.000', 'y': '0.000', 'z': '0.000'})
@@ -181,8 +532,25 @@ class Job:
             fh.write(self.parameters)
 
     def shutdown(self):
+        """Stops workers and releases hardware, then raises JobException if queued saves failed."""
+        error = None
+        if self.writer:
+            try:
+                self.writer.shutdown()
+            except Exception as e:
+                error = e
+        if self.scheduler:
+            self.scheduler.shutdown()
+        if self.profiler:
+            self.profiler.shutdown()
+        if self.statistics_fh:
+            self.statistics_fh.close()
+        if self.container:
+            self.container.close()
         self.controller.shutdown()
         self.camera.shutdown()
+        if error is not None:
+            raise JobException(f"{self.writer.failed} files failed to save, first: {error}")
 
     def status(self):
         if len(self.sequence) == 0:
@@ -1,8 +1,14 @@
-from . import mpl
 from . import numpy
 from . import opencv
 from . import scikit
 from . import spinnaker
+from . import stats
 
+try:
+    # Optional; histograms are plotted by opencv.plot_histogram
+    from . import mpl
+except ImportError:
+    mpl = None
 
-__all__ = ["mpl", "numpy", "opencv", "scikit", "spinnaker"]
+
+__all__ = ["numpy", "opencv", "scikit", "spinnaker", "stats"] + (["mpl"] if mpl is not None else [])
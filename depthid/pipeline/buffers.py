@@ -0,0 +1,87 @@
+from threading import Lock
+
+import numpy as np
+
+from depthid.cameras import Frame
+
+
+class BufferPool:
+    """Arrays reused between frames, keyed by shape and dtype.
+
+    Buffers are lent by acquire and return through recycle once no pipeline output references them, so that
+    steady state processing allocates no new arrays. Frames processed concurrently are lent distinct buffers.
+    """
+
+    def __init__(self, limit: int = 8):
+        """
+        Arguments:
+            limit (int): Idle buffers retained per shape and dtype, beyond which returned buffers are dropped.
+        """
+        self.limit = limit
+        self.lock = Lock()
+        self.idle = {}
+        self.lent = {}
+        self.allocated = 0
+
+    def acquire(self, shape: tuple, dtype) -> np.ndarray:
+        key = (tuple(shape), np.dtype(dtype))
+        with self.lock:
+            idle = self.idle.get(key)
+            if idle:
+                buffer = idle.pop()
+            else:
+                buffer = np.empty(shape, dtype=dtype)
+                self.allocated += buffer.nbytes
+            self.lent[id(buffer)] = buffer
+        return buffer
+
+    def release(self, buffer: np.ndarray) -> bool:
+        """Returns lent buffer to the pool, returning whether it was lent by the pool."""
+        with self.lock:
+            if self.lent.get(id(buffer)) is not buffer:
+                return False
+            del self.lent[id(buffer)]
+            idle = self.idle.setdefault((buffer.shape, buffer.dtype), [])
+            if len(idle) < self.limit:
+                idle.append(buffer)
+            else:
+                self.allocated -= buffer.nbytes
+        return True
+
+    def recycle(self, data, stack: list):
+        """Releases the buffer underlying data, unless it is still referenced by an output in the stack."""
+        if not isinstance(data, np.ndarray):
+            return
+        while isinstance(data.base, np.ndarray):
+            data = data.base
+        if id(data) not in self.lent:
+            return
+        if any(isinstance(other, np.ndarray) and np.may_share_memory(other, data) for other in stack):
+            return
+        self.release(data)
+
+    def __repr__(self):
+        idle = sum(len(buffers) for buffers in self.idle.values())
+        return f"BufferPool {len(self.lent)} lent, {idle} idle, {self.allocated / 2 ** 20:.1f}MiB allocated"
+
+
+def expire(stack: list, step, steps: list, complete, pool: BufferPool = None):
+    """Drops outputs which no incomplete step reads, once step has completed: its input, and its own output
+    where no step reads it. Frames are kept, as they are released to the camera driver with the stack.
+
+    Arguments:
+        stack (list): Step outputs, by step index.
+        step (Step): Completed step.
+        steps (list): Compiled steps.
+        complete (container): Indices of completed steps.
+        pool (BufferPool): Pool to which dropped buffers are returned.
+    """
+    for idx in (step.source, step.idx):
+        if type(idx) is not int or not all(consumer in complete for consumer in steps[idx].consumers):
+            continue
+        data = stack[idx]
+        if isinstance(data, Frame):
+            continue
+        stack[idx] = None
+        if pool is not None:
+            pool.recycle(data, stack)
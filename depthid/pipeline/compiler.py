@@ -0,0 +1,206 @@
+from inspect import signature
+from time import time
+
+import numpy as np
+
+from .contract import FRAME, SAME, names
+
+
+CAMERA = "camera"
+
+
+class Skipped:
+    """Output of a step which does not run on the current frame."""
+
+    def __repr__(self):
+        return "Skipped"
+
+
+SKIPPED = Skipped()
+
+
+class Step:
+    """Pipeline step resolved to a callable taking the stack of previous step outputs.
+
+    Steps whose function accepts an output buffer "out", not given in the definition, are passed a buffer of
+    their previous output's shape and dtype from the pipeline's buffer pool. Steps run every N frames, and
+    lazy steps only on frames where a step taking their output runs. Input and output dtypes declared by the
+    function are checked as the step runs.
+    """
+
+    __slots__ = (
+        "idx", "name", "source", "call", "time", "consumers", "reuse", "layout", "every", "lazy", "accepts", "returns"
+    )
+
+    def __init__(self, idx: int, name: str, source, call, reuse: bool = False, every: int = 1, lazy: bool = False,
+                 accepts: tuple = None, returns=None):
+        self.idx = idx
+        self.name = name
+        self.source = source
+        self.call = call
+        self.time = 0.0
+        # Indices of steps taking this step's output as input
+        self.consumers = ()
+        self.reuse = reuse
+        self.layout = None
+        self.every = every
+        self.lazy = lazy
+        self.accepts = accepts
+        self.returns = returns
+
+    def run(self, stack: list, pool=None) -> float:
+        """Runs step, storing its output in the stack and returning its duration in seconds.
+
+        Arguments:
+            stack (list): Step outputs, by step index.
+            pool (BufferPool): Pool lending output buffers, or None to allocate.
+
+        Raises:
+            TypeError: Input or output dtype differs from those declared.
+        """
+        source = stack[self.source] if type(self.source) is int else None
+        accepts = self.accepts
+        if accepts and isinstance(source, np.ndarray) and (accepts == FRAME or source.dtype not in accepts):
+            raise TypeError(f"{self}: input is {source.dtype}, expected {names(accepts)}")
+
+        out = pool.acquire(*self.layout) if pool is not None and self.reuse and self.layout else None
+        start = time()
+        data = self.call(stack, out)
+        elapsed = time() - start
+        self.time = elapsed
+
+        if self.returns not in (None, FRAME) and isinstance(data, np.ndarray):
+            returns = self.returns
+            if returns == SAME:
+                returns = (source.dtype,) if isinstance(source, np.ndarray) else (data.dtype,)
+            if data.dtype not in returns:
+                raise TypeError(f"{self}: returned {data.dtype}, declared {names(returns)}")
+
+        if out is not None and data is not out:
+            # Output changed shape or dtype, e.g. on switching camera profile
+            pool.release(out)
+        if self.reuse and isinstance(data, np.ndarray):
+            self.layout = (data.shape, data.dtype)
+        stack[self.idx] = data
+        return elapsed
+
+    def __repr__(self):
+        return f"Step {self.idx} {self.name}"
+
+
+def compile_pipeline(pipeline: list, modules: dict, camera) -> list:
+    """Resolves pipeline definition into steps, validating it before any hardware is started.
+
+    Each step is a dict of module "m", function "f", and optionally input "i" and keyword arguments "kw".
+    The input is the index of an earlier step, whose output is passed as the first argument, or "camera".
+    Steps may also set "every", to run every N frames, and "lazy", to run only when their output is used,
+    except steps taking "camera", which acquire each frame. Errors locate steps expanded from macros by their
+    "origin" in the pipeline as written.
+
+    Arguments:
+        pipeline (list): Step definitions, as in the job config.
+        modules (dict): Objects steps may name as "m", e.g. pipeline modules and the ui instance.
+        camera (Camera): Camera passed to steps whose input is "camera".
+
+    Returns:
+        steps (list): Step per definition, in order.
+
+    Raises:
+        ValueError: Definition names an unknown module or function, an invalid input, or arguments the
+            function does not accept.
+    """
+    steps = []
+    for idx, step in enumerate(pipeline):
+        name = f"{step.get('m')}.{step.get('f')}"
+        at = f"Step {idx} {name}"
+        if step.get('origin', f"step {idx}") != f"step {idx}":
+            at += f" ({step['origin']})"
+        try:
+            fn = getattr(modules[step['m']], step['f'])
+        except KeyError:
+            raise ValueError(f"{at}: expected module 'm' of {', '.join(modules)} and function 'f'")
+        except AttributeError:
+            raise ValueError(f"{at}: unknown function {step['f']}")
+        if not callable(fn):
+            raise ValueError(f"{at}: {step['f']} is not callable")
+
+        source = step.get('i')
+        if source not in (None, CAMERA) and (type(source) is not int or not 0 <= source < idx):
+            raise ValueError(f"{at}: input {source!r} must be \"{CAMERA}\" or an earlier step's index")
+
+        kw = step.get('kw', {})
+        if not isinstance(kw, dict):
+            raise ValueError(f"{at}: keyword arguments 'kw' must be an object")
+        every, lazy = step.get('every', 1), step.get('lazy', False)
+        if type(every) is not int or every < 1:
+            raise ValueError(f"{at}: 'every' must be a positive integer")
+        if not isinstance(lazy, bool):
+            raise ValueError(f"{at}: 'lazy' must be true or false")
+        if source == CAMERA and (every > 1 or lazy):
+            raise ValueError(f"{at}: steps taking \"{CAMERA}\" acquire every frame, so cannot be 'every' or 'lazy'")
+        reuse = False
+        try:
+            sig = signature(fn)
+            sig.bind(*([source] if source is not None else []), **kw)
+        except TypeError as e:
+            raise ValueError(f"{at}: {e}")
+        except ValueError:
+            # Signature of some builtins cannot be inspected
+            pass
+        else:
+            reuse = "out" in sig.parameters and "out" not in kw
+
+        accepts, returns = getattr(fn, "accepts", None), getattr(fn, "returns", None)
+        if accepts and type(source) is int:
+            produced = declared(steps, source)
+            if produced not in (None, FRAME) and (accepts == FRAME or not set(produced) <= set(accepts)):
+                raise ValueError(
+                    f"{at}: accepts {names(accepts)}, but {pipeline[source].get('origin', f'step {source}')} returns "
+                    f"{names(produced)}"
+                )
+
+        call = bind(fn, source, dict(kw), camera, reuse)
+        steps.append(Step(idx, name, source, call, reuse, every, lazy, accepts, returns))
+
+    for step in steps:
+        if type(step.source) is int:
+            steps[step.source].consumers += (step.idx,)
+    return steps
+
+
+def declared(steps: list, idx: int):
+    """Returns dtypes step idx is declared to return, following steps returning their input's dtype."""
+    step = steps[idx]
+    if step.returns == SAME:
+        return declared(steps, step.source) if type(step.source) is int else None
+    return step.returns
+
+
+def active(steps: list, frame: int) -> list:
+    """Returns whether each step runs on frame, numbered from 0.
+
+    A step runs on frames divisible by its every, provided its input step runs. A lazy step runs only where a
+    step taking its output runs.
+    """
+    run = [frame % step.every == 0 for step in steps]
+    for step in steps:
+        if type(step.source) is int and not run[step.source]:
+            run[step.idx] = False
+    for step in reversed(steps):
+        if step.lazy and not any(run[consumer] for consumer in step.consumers):
+            run[step.idx] = False
+    return run
+
+
+def bind(fn, source, kw: dict, camera, reuse: bool = False):
+    """Returns callable taking the stack and an output buffer, with input and keyword arguments bound."""
+    if source == CAMERA:
+        inputs = lambda stack: (camera,)
+    elif source is None:
+        inputs = lambda stack: ()
+    else:
+        inputs = lambda stack: (stack[source],)
+
+    if reuse:
+        return lambda stack, out: fn(*inputs(stack), out=out, **kw)
+    return lambda stack, out: fn(*inputs(stack), **kw)
@@ -0,0 +1,51 @@
+import cv2
+import numpy as np
+
+
+# Declared return dtype of steps whose output has the dtype of their input
+SAME = "same"
+# Declared dtype of camera frames which are not ndarrays, e.g. PySpin images, checked once converted
+FRAME = "frame"
+
+# 8 bit value: 16 bit value of the same fraction of full scale, so that 255 maps to 65535
+uint8_to_uint16 = (np.arange(256, dtype=np.uint16) * 257).astype(np.uint16)
+
+
+def dtypes(accepts=None, returns=None):
+    """Declares the dtypes a pipeline step accepts as input and returns, checked by the compiled pipeline.
+
+    Where a step's declared input conflicts with the declared output of the step feeding it, the pipeline is
+    rejected when compiled; otherwise inputs and outputs are checked as each step runs, so that values are
+    never silently converted, e.g. float written into an integer frame.
+
+    Arguments:
+        accepts (tuple): Input dtypes, FRAME for camera frames, or None for any.
+        returns: Output dtype, tuple of dtypes, SAME for the input's dtype, FRAME, or None for any.
+    """
+    def declare(fn):
+        fn.accepts = accepts if accepts == FRAME else _normalize(accepts)
+        fn.returns = returns if returns in (None, SAME, FRAME) else _normalize(returns)
+        return fn
+    return declare
+
+
+def _normalize(types):
+    if types is None:
+        return None
+    if not isinstance(types, (tuple, list)):
+        types = (types,)
+    return tuple(np.dtype(t) for t in types)
+
+
+def names(types) -> str:
+    return types if types == FRAME else " or ".join(t.name for t in types)
+
+
+def expand_uint8(data: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """Scales 8 bit values to the full 16 bit range through a lookup table, without float arithmetic.
+
+    Arguments:
+        data (np.ndarray): uint8 image.
+        out (np.ndarray): uint16 output of the same shape, which may be a view, e.g. a panel of a larger image.
+    """
+    return cv2.LUT(data, uint8_to_uint16, dst=out)
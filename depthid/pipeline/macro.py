@@ -0,0 +1,136 @@
+from copy import deepcopy
+
+from .compiler import CAMERA
+
+
+INPUT = "input"
+
+# Name: definition. Steps are pipeline steps whose input "i" is the index of an earlier step within the macro,
+# "camera", or "input" for the macro's own input. Keyword argument values of the form "$name" are replaced by
+# the macro's parameter of that name. The macro's output is that of its output step, by default the last.
+macros = {
+    "capture": {
+        "params": {"wait_before": 0.0, "wait_after": 0.0, "policy": None},
+        "steps": [
+            {"m": "spinnaker", "f": "capture", "i": CAMERA,
+             "kw": {"wait_before": "$wait_before", "wait_after": "$wait_after", "policy": "$policy"}},
+            {"m": "spinnaker", "f": "transform_ndarray", "i": 0}
+        ]
+    },
+    "capture_and_save": {
+        "params": {"wait_before": 0.0, "wait_after": 0.0, "policy": None, "formats": None},
+        "steps": [
+            {"m": "spinnaker", "f": "capture", "i": CAMERA,
+             "kw": {"wait_before": "$wait_before", "wait_after": "$wait_after", "policy": "$policy"}},
+            {"m": "spinnaker", "f": "transform_ndarray", "i": 0},
+            {"m": "job", "f": "save", "i": 0, "kw": {"formats": "$formats"}}
+        ],
+        "output": 1
+    },
+    "histogram_plot": {
+        "params": {"bins": 1024, "log": "10", "stride": 1},
+        "steps": [
+            {"m": "stats", "f": "histogram", "i": INPUT, "kw": {"bins": "$bins", "stride": "$stride"}},
+            {"m": "opencv", "f": "plot_histogram", "i": 0, "kw": {"log": "$log"}}
+        ],
+        # Only plotted when displayed
+        "lazy": True
+    },
+    "live_preview": {
+        "params": {"bins": 1024, "log": "10", "stride": 1, "panel": "main", "histogram_panel": "sub1"},
+        "steps": [
+            {"m": "opencv", "f": "gray_to_rgb", "i": INPUT},
+            {"macro": "histogram_plot", "i": INPUT, "kw": {"bins": "$bins", "log": "$log", "stride": "$stride"}},
+            {"m": "ui", "f": "display", "i": 0, "kw": {"panel": "$panel"}},
+            {"m": "ui", "f": "display", "i": 1, "kw": {"panel": "$histogram_panel"}},
+            {"m": "ui", "f": "display_status"}
+        ],
+        "output": 0
+    }
+}
+
+
+def expand(pipeline: list, library: dict = None) -> list:
+    """Expands macro steps into the flat step list, rewriting step inputs to the expanded indices.
+
+    A macro step names a macro and optionally its input "i", parameters "kw", and "every" and "lazy",
+    overriding the macro's own. Steps of a macro run every N frames, multiplying those of enclosing
+    macros, and lazy steps run only on frames where a step taking their output runs. Inputs of steps after
+    a macro step refer to it by its index in the unexpanded pipeline, and receive the macro's output.
+
+    Arguments:
+        pipeline (list): Step and macro step definitions, as in the job config.
+        library (dict): Macro definitions, in addition to or replacing the built-in macros.
+
+    Returns:
+        steps (list): Step definitions, with any "every" and "lazy" settings, and "origin" locating each in the
+            pipeline as written, e.g. "step 1, macro live_preview step 0", for error messages.
+
+    Raises:
+        ValueError: Unknown macro or parameter, invalid input, or recursive macro.
+    """
+    library = dict(macros, **(library or {}))
+    steps, _ = _expand(pipeline, library, None, 0, (), "")
+    return steps
+
+
+def _expand(pipeline: list, library: dict, source, offset: int, names: tuple, origin: str):
+    # Returns expanded steps, and the expanded index of each entry's output
+    steps, outputs = [], []
+    context = f"Macro {names[-1]} step" if names else "Step"
+    for idx, step in enumerate(pipeline):
+        step = dict(step)
+        if step.get('i') == INPUT:
+            if not names:
+                raise ValueError(f"{context} {idx}: input \"{INPUT}\" is only valid within macros")
+            if source is None:
+                raise ValueError(f"Macro {names[-1]} requires an input \"i\"")
+            step['i'] = source
+        elif type(step.get('i')) is int:
+            if not 0 <= step['i'] < idx:
+                raise ValueError(f"{context} {idx}: input {step['i']} must be an earlier step's index")
+            step['i'] = outputs[step['i']]
+
+        if 'macro' not in step:
+            step['origin'] = f"{origin}step {idx}"
+            steps.append(step)
+            outputs.append(offset + len(steps) - 1)
+            continue
+
+        name = step['macro']
+        if name not in library:
+            raise ValueError(f"{context} {idx}: unknown macro {name}, expected one of {', '.join(library)}")
+        if name in names:
+            raise ValueError(f"{context} {idx}: macro {name} includes itself")
+        definition = library[name]
+        params = dict(definition.get('params', {}))
+        unknown = set(step.get('kw', {})) - set(params)
+        if unknown:
+            raise ValueError(f"{context} {idx}: unknown parameters {', '.join(sorted(unknown))} of macro {name}")
+        params.update(step.get('kw', {}))
+
+        body = _substitute(deepcopy(definition['steps']), params, name)
+        inner, inner_outputs = _expand(
+            body, library, step.get('i'), offset + len(steps), names + (name,), f"{origin}step {idx}, macro {name} "
+        )
+        every = step.get('every', definition.get('every', 1))
+        lazy = step.get('lazy', definition.get('lazy', False))
+        for s in inner:
+            s['every'] = s.get('every', 1) * every if isinstance(every, int) else every
+            s['lazy'] = s.get('lazy', False) or lazy
+
+        steps.extend(inner)
+        outputs.append(inner_outputs[definition.get('output', len(body) - 1)])
+    return steps, outputs
+
+
+def _substitute(value, params: dict, name: str):
+    if isinstance(value, dict):
+        return {k: _substitute(v, params, name) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_substitute(v, params, name) for v in value]
+    if isinstance(value, str) and value.startswith("$"):
+        if value[1:] not in params:
+            raise ValueError(f"Macro {name} refers to undefined parameter {value[1:]}")
+        return params[value[1:]]
+    return value
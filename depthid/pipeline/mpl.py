@@ -3,6 +3,8 @@ import matplotlib.style
 import matplotlib as mpl
 from matplotlib import pyplot as plt
 
+from .contract import dtypes, expand_uint8
+
 
 mpl.style.use("dark_background")
 mpl.rcParams['figure.figsize'] = [10.2, 7.5]
@@ -16,7 +18,8 @@ g_cache = {}
 np.seterr(divide='ignore')
 
 
-def plot_histogram_fast(data: np.ndarray, log: str = "10", name: str = "1"):
+@dtypes(returns=np.uint16)
+def plot_histogram_fast(data: np.ndarray, log: str = "10", name: str = "1", out: np.ndarray = None):
     global g_cache
 
     try:
@@ -50,13 +53,12 @@ def plot_histogram_fast(data: np.ndarray, log: str = "10", name: str = "1"):
     ax.draw_artist(line)
     fig.canvas.blit(ax.bbox)
 
-    plt.close('all')
-
     d = np.frombuffer(fig.canvas.tostring_rgb(), dtype=np.uint8)
     d = d.reshape(fig.canvas.get_width_height()[::-1] + (3,))
-    return d.astype(np.uint16) / d.max() * 65536
+    return expand_uint8(d, out if out is not None and out.shape == d.shape else None)
 
 
+@dtypes(returns=np.uint16)
 def plot_histogram(data: np.ndarray):
     fig = plt.figure()
     fig.tight_layout(pad=0)
@@ -72,9 +74,6 @@ def plot_histogram(data: np.ndarray):
     d = np.frombuffer(fig.canvas.tostring_rgb(), dtype=np.uint8)  # 0
     d = d.reshape(fig.canvas.get_width_height()[::-1] + (3,))  # 0
 
-    # Scale to uint16 space (65536)
-    # todo: surely there must be a better way
-    d = d.astype(np.uint16) / d.max() * 65536
-    plt.close('all')
-    return d
+    plt.close(fig)
+    return expand_uint8(d)
 
@@ -1,5 +1,9 @@
 import numpy as np
 
+from . import stats
+from .contract import dtypes
 
-def histogram(data: np.ndarray, bins: int = 4192, min_v: int = 0, max_v: int = 65536):
-    return np.histogram(data.ravel(), bins, (min_v, max_v))[0]
+
+@dtypes(accepts=(np.uint8, np.uint16, np.float32), returns=np.float32)
+def histogram(data: np.ndarray, bins: int = 4192, min_v: int = 0, max_v: int = 65536, **kw):
+    return stats.histogram(data, bins, min_v, max_v, **kw)
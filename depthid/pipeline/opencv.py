@@ -1,28 +1,243 @@
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
 import numpy as np
 
+from . import stats
+from .contract import SAME, dtypes, expand_uint8
+
 
-def histogram(data: np.ndarray, channel: int = 0, bins: int = 4196, min_v: int = 0, max_v: int = 65536) -> np.ndarray:
+@dtypes(accepts=(np.uint8, np.uint16, np.float32), returns=np.float32)
+def histogram(data: np.ndarray, channel: int = 0, bins: int = 4196, min_v: int = 0, max_v: int = 65536,
+              out: np.ndarray = None, **kw) -> np.ndarray:
     """Generates histogram of pixel intensity for given channel.
 
     Arguments:
         data (np.ndarray): Image ndarray
         channel (int): Color channel (0, for greyscale)
-        bins (int):
+        bins (int): Number of bins between min_v and max_v
         min_v (int): Minimum value
         max_v (int): Maximum value
+        out (np.ndarray): Preallocated float32 output of shape (bins,)
+        kw: Further arguments of stats.histogram, e.g. roi, mask and stride
 
     Returns:
         data (np.ndarray): Histogram
     """
-    # todo: mask for ROI
-    # todo: document bins
-    return cv2.calcHist([data], [channel], None, [bins], (min_v, max_v))
+    return stats.histogram(data, bins, min_v, max_v, channel=channel, out=out, **kw)
 
 
-def gray_to_rgb(data: np.ndarray) -> np.ndarray:
-    return cv2.cvtColor(data, cv2.COLOR_GRAY2RGB)
+@dtypes(accepts=(np.uint8, np.uint16, np.float32), returns=SAME)
+def gray_to_rgb(data: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    return cv2.cvtColor(data, cv2.COLOR_GRAY2RGB, dst=out)
 
 
+@dtypes(accepts=(np.uint8, np.uint16, np.float32))
 def save(data: np.ndarray, fn: str):
     cv2.imwrite(fn, data)
+
+
+# Panel name: (key, axes and labels drawn once, plot area and y range), redrawn when the key changes
+plots = {}
+logs = {"e": np.log, "2": np.log2, "10": np.log10}
+# 8 bit BGR, after matplotlib's dark_background style
+plot_colours = {"axes": (255, 255, 255), "line": (199, 211, 141), "channels": [(255, 0, 0), (0, 255, 0), (0, 0, 255)]}
+plot_font = cv2.FONT_HERSHEY_SIMPLEX
+
+
+@dtypes(returns=np.uint16)
+def plot_histogram(data: np.ndarray, log: str = "10", name: str = "1", width: int = 612, height: int = 450,
+                   out: np.ndarray = None) -> np.ndarray:
+    """Plots histogram as a BGR image, drawing the curve over cached axes and labels.
+
+    Axes, ticks and labels are drawn once per panel name, and redrawn only when the number of bins, scale,
+    panel size or frame's pixel count change; each frame copies them and draws the curve. Log scales span
+    the frame's pixel count, so no bin is clipped; the linear scale spans the first frame's peak.
+
+    Arguments:
+        data (np.ndarray): Histogram counts, e.g. from histogram, of shape (bins,) or (bins, channels).
+        log (str): Base of the count axis, "e", "2" or "10", or None for linear.
+        name (str): Panel name, identifying the cached axes.
+        width (int): Panel width.
+        height (int): Panel height.
+        out (np.ndarray): uint16 output of shape (height, width, 3).
+
+    Returns:
+        data (np.ndarray): uint16 BGR image
+
+    Raises:
+        ValueError: log is not a base of the count axis.
+    """
+    if log is not None and log not in logs:
+        raise ValueError(f"Unknown log {log!r}, expected one of {', '.join(logs)} or None for linear")
+    counts = data.reshape(len(data), -1)
+    bins, channels = counts.shape
+    total = float(counts.sum()) / channels
+    key = (bins, log, width, height, total if log in logs else None)
+    if name not in plots or plots[name][0] != key:
+        top = logs[log](max(total, 1)) if log in logs else float(counts.max())
+        plots[name] = (key,) + _plot_axes(bins, log, top, width, height)
+    _, axes, (left, upper, right, lower), top = plots[name]
+
+    values = logs[log](np.maximum(counts, 1)) if log in logs else counts
+    points = np.empty((channels, bins, 1, 2), dtype=np.int32)
+    points[..., 0, 0] = np.linspace(left, right, bins)
+    points[..., 0, 1] = (lower - np.minimum(values, top) * ((lower - upper) / top)).T
+
+    if out is None or out.shape != axes.shape or out.dtype != axes.dtype:
+        out = np.empty_like(axes)
+    np.copyto(out, axes)
+    # A curve per channel, in the channel's colour
+    colours = [plot_colours["line"]] if channels == 1 else plot_colours["channels"]
+    for curve, colour in zip(points, colours):
+        cv2.polylines(out, [curve], False, tuple(c * 257 for c in colour), 1)
+    return out
+
+
+def _plot_axes(bins: int, log: str, top: float, width: int, height: int):
+    # Plot area within the panel, as matplotlib's default subplot margins
+    left, right = int(width * .125), int(width * .9)
+    upper, lower = int(height * .12), int(height * .89)
+    colour = plot_colours["axes"]
+
+    y_ticks = _ticks(top)
+    top = y_ticks[-1]
+    panel = np.zeros((height, width, 3), dtype=np.uint8)
+    cv2.rectangle(panel, (left, upper), (right, lower), colour, 1)
+
+    for tick in _ticks(bins - 1):
+        x = int(left + tick * (right - left) / max(bins - 1, 1))
+        if x > right:
+            continue
+        cv2.line(panel, (x, lower), (x, lower + 5), colour, 1)
+        _put_text(panel, f"{tick:g}", (x, lower + 20), .45, centre=True)
+    for tick in y_ticks:
+        y = int(lower - tick * (lower - upper) / top)
+        cv2.line(panel, (left - 5, y), (left, y), colour, 1)
+        label = f"{tick:g}"
+        (w, h), _ = cv2.getTextSize(label, plot_font, .45, 1)
+        _put_text(panel, label, (left - 9 - w, y + h // 2), .45)
+
+    _put_text(panel, "Pixel Intensity", (width // 2, upper - 12), .6, centre=True)
+    _put_text(panel, f"Intensity ({bins} bin)", ((left + right) // 2, height - 10), .5, centre=True)
+
+    # Vertical label, drawn horizontally and rotated
+    label = f"# of Pixels (log{log})" if log is not None else "# of Pixels"
+    (w, h), baseline = cv2.getTextSize(label, plot_font, .5, 1)
+    strip = np.zeros((h + baseline, w, 3), dtype=np.uint8)
+    _put_text(strip, label, (0, h), .5)
+    strip = cv2.rotate(strip, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    y = max((upper + lower - w) // 2, 0)
+    panel[y:y + strip.shape[0], 4:4 + strip.shape[1]] = strip[:height - y]
+
+    return expand_uint8(panel), (left, upper, right, lower), top
+
+
+def _ticks(top: float, count: int = 6) -> np.ndarray:
+    # Round steps of 1, 2 or 5 times a power of ten, from zero to at least top
+    top = max(top, 1)
+    magnitude = 10 ** np.floor(np.log10(top / count))
+    step = next(m * magnitude for m in (1, 2, 5, 10) if m * magnitude >= top / count)
+    return np.arange(0, np.ceil(top / step) + 1) * step
+
+
+def _put_text(panel: np.ndarray, text: str, origin: tuple, scale: float, centre: bool = False):
+    x, y = origin
+    if centre:
+        x -= cv2.getTextSize(text, plot_font, scale, 1)[0][0] // 2
+    cv2.putText(panel, text, (int(x), int(y)), plot_font, scale, plot_colours["axes"], 1, cv2.LINE_AA)
+
+
+# Sensor Bayer pattern, by colour of the first two pixels: OpenCV conversion codes. OpenCV names patterns by the
+# second row's first two pixels, so an RGGB sensor converts with BayerBG.
+bayer_codes = {
+    "bilinear": {
+        "RG": cv2.COLOR_BayerBG2BGR, "GR": cv2.COLOR_BayerGB2BGR,
+        "GB": cv2.COLOR_BayerGR2BGR, "BG": cv2.COLOR_BayerRG2BGR
+    },
+    "edge_aware": {
+        "RG": cv2.COLOR_BayerBG2BGR_EA, "GR": cv2.COLOR_BayerGB2BGR_EA,
+        "GB": cv2.COLOR_BayerGR2BGR_EA, "BG": cv2.COLOR_BayerRG2BGR_EA
+    }
+}
+# Sensor Bayer pattern: 2x2 cell, row by row
+bayer_tiles = {"RG": "RGGB", "GR": "GRBG", "GB": "GBRG", "BG": "BGGR"}
+# Rows beyond each tile read by the algorithm's neighbourhood; even, to preserve the Bayer phase
+halos = {"nearest": 0, "bilinear": 2, "edge_aware": 4}
+executors = {}
+buffers = {}
+
+
+@dtypes(accepts=(np.uint8, np.uint16), returns=SAME)
+def demosaic(data: np.ndarray, pattern: str = "RG", algorithm: str = "bilinear", tiles: int = 4,
+             workers: int = None, reuse: bool = False, out: np.ndarray = None) -> np.ndarray:
+    """Interpolates Bayer mosaic into BGR image, processing horizontal tiles in parallel.
+
+    Each tile is converted with a halo of neighbouring rows, so that tiled output matches whole-frame output,
+    on a shared thread pool; OpenCV releases the GIL during conversion.
+
+    Arguments:
+        data (np.ndarray): Raw Bayer image, uint8 or uint16.
+        pattern (str): Colours of the sensor's first two pixels, e.g. "RG" for Bayer RG.
+        algorithm (str): "nearest" replicates each 2x2 cell's samples, "bilinear" averages neighbours, and
+            "edge_aware" interpolates along edges.
+        tiles (int): Number of horizontal tiles.
+        workers (int): Threads converting tiles, defaulting to the number of processors.
+        reuse (bool): Write into an output buffer retained between calls. The buffer is overwritten by the next
+            frame, so reuse only where frames are not processed concurrently or kept beyond the pipeline.
+        out (np.ndarray): Output buffer of shape (height, width, 3) and the input's dtype.
+
+    Returns:
+        data (np.ndarray): BGR image
+    """
+    if algorithm not in halos:
+        raise ValueError(f"Unknown demosaic algorithm {algorithm}, expected one of {', '.join(halos)}")
+    if pattern not in bayer_codes["bilinear"]:
+        raise ValueError(f"Unknown Bayer pattern {pattern}, expected one of {', '.join(bayer_codes['bilinear'])}")
+
+    height, width = data.shape
+    if height % 2 or width % 2:
+        raise ValueError(f"Bayer image dimensions must be even, got {width}x{height}")
+    shape = (height, width, 3)
+    if out is None and reuse:
+        out = buffers.get((shape, data.dtype))
+        if out is None:
+            out = buffers[(shape, data.dtype)] = np.empty(shape, dtype=data.dtype)
+    elif out is None:
+        out = np.empty(shape, dtype=data.dtype)
+
+    # Tile boundaries fall on even rows, preserving the Bayer phase within each tile
+    step = -(-height // tiles)
+    step += step % 2
+    bounds = [(start, min(start + step, height)) for start in range(0, height, step)]
+    if len(bounds) == 1:
+        _demosaic_tile(data, out, pattern, algorithm, 0, height)
+        return out
+
+    if workers not in executors:
+        executors[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="demosaic")
+    for future in [
+        executors[workers].submit(_demosaic_tile, data, out, pattern, algorithm, start, stop)
+        for start, stop in bounds
+    ]:
+        future.result()
+    return out
+
+
+def _demosaic_tile(data: np.ndarray, out: np.ndarray, pattern: str, algorithm: str, start: int, stop: int):
+    if algorithm == "nearest":
+        tile = bayer_tiles[pattern]
+        cell = data[start:stop]
+        for channel, colour in enumerate("BGR"):
+            for dy in (0, 1):
+                # Green takes the green site in its own row; red and blue are shared by the whole cell
+                site = tile.index(colour, 2 * dy) if colour == "G" else tile.index(colour)
+                samples = cell[site // 2::2, site % 2::2]
+                for dx in (0, 1):
+                    out[start + dy:stop:2, dx::2, channel] = samples
+        return
+
+    halo = halos[algorithm]
+    lo, hi = max(start - halo, 0), min(stop + halo, data.shape[0])
+    converted = cv2.cvtColor(data[lo:hi], bayer_codes[algorithm][pattern])
+    out[start:stop] = converted[start - lo:stop - lo]
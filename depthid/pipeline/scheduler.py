@@ -0,0 +1,92 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .buffers import BufferPool, expire
+from .compiler import CAMERA, SKIPPED
+
+
+class Scheduler:
+    """Runs compiled pipeline steps concurrently, each once the steps it depends on have completed.
+
+    A step depends on the step named by its input. Steps reading the camera depend on the previous such step,
+    so that the camera is used in order. Steps without an input may rely on side effects of any earlier step,
+    e.g. the ui composing panels, so depend on every earlier step. Outputs are written to fixed stack
+    positions, so results do not depend on the order in which independent steps complete.
+    """
+
+    def __init__(self, steps: list, workers: int):
+        """
+        Arguments:
+            steps (list): Compiled steps, as returned by compile_pipeline.
+            workers (int): Threads running steps.
+        """
+        self.steps = steps
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="step")
+        self.depends = {}
+        camera = None
+        for step in steps:
+            if step.source == CAMERA:
+                self.depends[step.idx] = {camera} - {None}
+                camera = step.idx
+            elif step.source is None:
+                self.depends[step.idx] = set(range(step.idx))
+            else:
+                self.depends[step.idx] = {step.source}
+
+    def run(self, stack: list, start_idx: int = 0, stop_idx: int = None, prepare=None, record=None,
+            pool: BufferPool = None, reuse: bool = False):
+        """Runs steps from start_idx up to stop_idx into stack. Steps before start_idx, and steps marked skipped,
+        are taken as complete. Outputs are dropped once every step reading them has completed.
+
+        Arguments:
+            stack (list): Step outputs, by step index.
+            prepare (callable): Called on the worker thread before each step, e.g. to set thread-local state.
+            record (callable): Called on the worker thread after each step with the step, its duration and output.
+            pool (BufferPool): Pool to which dropped output buffers are returned.
+            reuse (bool): Lend steps output buffers from the pool.
+
+        Raises:
+            The first exception raised by a step, once running steps have completed. Steps which depend on a
+            failed step are not run.
+        """
+        pending = {step.idx: step for step in self.steps[start_idx:stop_idx]}
+        complete = set(range(start_idx))
+        skipped = [idx for idx in pending if stack[idx] is SKIPPED]
+        complete.update(skipped)
+        for idx in skipped:
+            del pending[idx]
+            expire(stack, self.steps[idx], self.steps, complete, pool)
+        lender = pool if reuse else None
+        running = {}
+        error = None
+
+        while pending or running:
+            if error is None:
+                incomplete = pending.keys() | set(running.values())
+                for idx in [idx for idx in pending if not self.depends[idx] & incomplete]:
+                    running[self.executor.submit(self.call, pending.pop(idx), stack, prepare, record, lender)] = idx
+            elif not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                idx = running.pop(future)
+                if future.exception() is not None:
+                    error = error or future.exception()
+                else:
+                    complete.add(idx)
+                    expire(stack, self.steps[idx], self.steps, complete, pool)
+
+        if error is not None:
+            raise error
+        return stack
+
+    @staticmethod
+    def call(step, stack: list, prepare=None, record=None, pool: BufferPool = None):
+        if prepare is not None:
+            prepare()
+        seconds = step.run(stack, pool)
+        if record is not None:
+            record(step, seconds, stack[step.idx])
+
+    def shutdown(self):
+        self.executor.shutdown()
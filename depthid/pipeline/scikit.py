@@ -1,7 +1,13 @@
 import skimage
 import numpy as np
 
+from .contract import dtypes, expand_uint8
 
-def convert_uint8_uint16(data: np.ndarray) -> np.ndarray:
+
+@dtypes(returns=np.uint16)
+def convert_uint8_uint16(data: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    if data.dtype == np.uint8:
+        # Equivalent to img_as_uint, which scales 8 bit values by 257
+        return expand_uint8(data, out if out is not None and out.shape == data.shape else None)
     return skimage.img_as_uint(data)
 
@@ -1,29 +1,48 @@
-from time import sleep
+from time import sleep, time
 
-from numpy import ndarray
-from PySpin import Image, HQ_LINEAR, IEnumerationT_PixelFormatEnums, Camera
+from numpy import ndarray, uint8, uint16
 
+try:
+    from PySpin import Image, HQ_LINEAR, IEnumerationT_PixelFormatEnums
+except ImportError:
+    # Capture, transform_ndarray and save also serve synthetic cameras, which do not require PySpin
+    Image, HQ_LINEAR, IEnumerationT_PixelFormatEnums = None, None, None
 
-def capture(camera: Camera, wait_before: float, wait_after: float) -> Image:
+from depthid.cameras.camera import Camera
+from depthid.cameras.packing import unpack
+from depthid.pipeline.contract import FRAME, dtypes
+
+
+@dtypes(returns=FRAME)
+def capture(camera: Camera, wait_before: float, wait_after: float, policy: str = None) -> Image:
     """Captures image from camera.
 
+    The returned frame holds a driver buffer, which is returned to the driver once the pipeline has
+    completed; steps which keep the image or its ndarray beyond the pipeline must copy or retain it.
+
+    When the camera acquires on a background thread, frames acquired before the camera's arrival time, set by
+    the job on arriving at each waypoint in automatic mode, or during wait_before, are discarded, so that none
+    is saved under the wrong waypoint. Otherwise, e.g. in interactive and continuous modes, queued frames are
+    captured in turn under the "every" policy.
+
     Arguments:
-        camera (PySpinCamera): Instance of camera to capture from.
+        camera (Camera): Instance of camera to capture from.
         wait_before (float): Seconds to wait before performing capture.
         wait_after (float): Seconds to wait after performing capture.
+        policy (str): For threaded cameras, "newest" for the freshest frame or "every" for each frame in turn.
 
     Returns:
-        data (Image)
+        data (Frame)
     """
     sleep(wait_before)
-    image = camera.GetNextImage()
-    image.Release()
+    image = camera.capture(policy=policy, since=time() if wait_before else camera.arrival)
     sleep(wait_after)
     return image
 
 
+@dtypes(accepts=FRAME, returns=(uint8, uint16))
 def transform_ndarray(data: Image) -> ndarray:
-    """Transforms PySpin image into numpy ndarray.
+    """Transforms PySpin image into numpy ndarray, a view of the image buffer.
 
     Arguments:
         data (Image): Source image.
@@ -34,6 +53,25 @@ def transform_ndarray(data: Image) -> ndarray:
     return data.GetNDArray()
 
 
+@dtypes(accepts=FRAME, returns=uint16)
+def unpack_ndarray(data: Image, out: ndarray = None, chunk: int = 1 << 16) -> ndarray:
+    """Unpacks Mono12Packed, Mono12p or Mono10p image into uint16 numpy ndarray.
+
+    Packed formats transfer 25% (12 bit) or 37.5% (10 bit) fewer bytes than Mono16, allowing higher frame rates
+    over the same link, at the cost of unpacking on the host.
+
+    Arguments:
+        data (Image): Source image.
+        out (ndarray): Preallocated uint16 output of the image's shape, allocated when omitted.
+        chunk (int): Number of packed pixel groups unpacked per pass.
+
+    Returns:
+        data (ndarray)
+    """
+    return unpack(data.GetData(), data.GetPixelFormatName(), (data.GetHeight(), data.GetWidth()), out, chunk)
+
+
+@dtypes(accepts=FRAME, returns=FRAME)
 def convert_format(data: Image, output_format: IEnumerationT_PixelFormatEnums) -> Image:
     """Transforms PySpin image into specified output format.
 
@@ -47,6 +85,7 @@ def convert_format(data: Image, output_format: IEnumerationT_PixelFormatEnums) -
     return data.Convert(output_format, HQ_LINEAR)
 
 
+@dtypes(accepts=FRAME)
 def save(data: Image, filename: str) -> bool:
     """Saves provided image to disk using specified filename.
 
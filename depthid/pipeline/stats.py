@@ -0,0 +1,192 @@
+import cv2
+import numpy as np
+
+from .contract import dtypes
+
+
+# Panel name: Statistics of the most recent histogram of that name, e.g. for the ui status panel
+latest = {}
+# Integer dtype: intensity of each full resolution histogram bin, for the mean
+intensities = {}
+# Mask filename: mask image, loaded once
+masks = {}
+
+
+class Statistics:
+    """Summary of the pixels binned into a histogram.
+
+    Attributes:
+        count (int): Pixels counted.
+        min (float): Lowest intensity.
+        max (float): Highest intensity.
+        mean (float): Mean intensity.
+        low (float): Intensity at the lower clip percentile.
+        high (float): Intensity at the upper clip percentile.
+        saturated (float): Fraction of pixels at or above the saturation level.
+    """
+
+    __slots__ = ("count", "min", "max", "mean", "low", "high", "saturated")
+
+    def __init__(self, count: int, min_v: float, max_v: float, mean: float, low: float, high: float,
+                 saturated: float):
+        self.count = count
+        self.min = min_v
+        self.max = max_v
+        self.mean = mean
+        self.low = low
+        self.high = high
+        self.saturated = saturated
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __str__(self):
+        return (
+            f"min {self.min:g} max {self.max:g} mean {self.mean:.1f} clip {self.low:g}-{self.high:g} "
+            f"saturated {self.saturated:.2%}"
+        )
+
+
+@dtypes(accepts=(np.uint8, np.uint16, np.float32), returns=np.float32)
+def histogram(data: np.ndarray, bins: int = 1024, min_v: int = 0, max_v: int = 65536, channel: int = None,
+              roi: list = None, mask: np.ndarray = None, stride: int = 1, clip: tuple = (0.5, 99.5),
+              saturation: float = None, name: str = "1", out: np.ndarray = None) -> np.ndarray:
+    """Generates histogram of pixel intensity, and statistics of the same pixels, stored in latest[name].
+
+    Integer images are counted at full resolution (256 or 65536 values) by OpenCV's integer path, from which
+    the statistics are exact, then summed into bins; for power of two bin counts spanning a power of two
+    range this is equivalent to binning by shifting each value. Float images are binned by numpy.
+
+    Arguments:
+        data (np.ndarray): Image, of shape (height, width) or (height, width, channels).
+        bins (int): Number of bins between min_v and max_v. Integer images are binned at most one bin per value,
+            so that e.g. 1024 bins of a uint8 image over its full range returns 256 bins.
+        min_v (int): Minimum value.
+        max_v (int): Maximum value, exclusive.
+        channel (int): Channel counted, or None for every channel, each in its own column.
+        roi (list): Region counted, as [offset_x, offset_y, width, height].
+        mask (np.ndarray): Non-zero where pixels are counted, of the image's height and width, or the filename
+            of a mask image.
+        stride (int): Count every Nth pixel of every Nth row, e.g. 2 or 4 for preview.
+        clip (tuple): Lower and upper percentiles reported as clip points.
+        saturation (float): Intensity at and above which pixels are saturated, by default the dtype's maximum.
+        name (str): Name under which statistics are stored in latest.
+        out (np.ndarray): float32 output of the returned shape.
+
+    Returns:
+        data (np.ndarray): float32 counts of shape (bins,), or (bins, channels) where channel is None and the
+            image has channels.
+    """
+    image, mask, channels = _select(data, channel, roi, mask, stride)
+    if data.dtype.kind == "f":
+        counts, stats = _float_histogram(image, mask, channels, bins, min_v, max_v, clip, saturation)
+    else:
+        counts, stats = _integer_histogram(image, mask, channels, bins, min_v, max_v, clip, saturation)
+
+    latest[name] = stats
+    if out is None or out.shape != counts.shape or out.dtype != np.float32:
+        return counts.astype(np.float32)
+    np.copyto(out, counts)
+    return out
+
+
+def statistics(data: np.ndarray, stride: int = 1, clip: tuple = (0.5, 99.5), saturation: float = None) -> Statistics:
+    """Returns statistics of every channel of an image, without binning.
+
+    Arguments:
+        data (np.ndarray): Image, uint8, uint16 or float32.
+        stride (int): Count every Nth pixel of every Nth row.
+    """
+    if data.ndim == 1:
+        data = data.reshape(1, -1)
+    image, mask, channels = _select(data, None, None, None, stride)
+    if data.dtype.kind == "f":
+        return _float_histogram(image, mask, channels, 1, 0, 1, clip, saturation)[1]
+    levels = _levels(data.dtype)
+    return _integer_histogram(image, mask, channels, 1, 0, levels, clip, saturation)[1]
+
+
+def _select(data: np.ndarray, channel: int, roi: list, mask: np.ndarray, stride: int):
+    # Views of the counted region and mask, and the channels counted
+    if isinstance(mask, str):
+        if mask not in masks:
+            masks[mask] = cv2.imread(mask, cv2.IMREAD_GRAYSCALE)
+            if masks[mask] is None:
+                raise ValueError(f"Unable to read histogram mask {mask}")
+        mask = masks[mask]
+    if roi is not None:
+        x, y, w, h = roi
+        data = data[y:y + h, x:x + w]
+        mask = mask[y:y + h, x:x + w] if mask is not None else None
+    if stride > 1:
+        data = data[::stride, ::stride]
+        mask = mask[::stride, ::stride] if mask is not None else None
+    if mask is not None:
+        mask = mask.astype(np.uint8, copy=False)
+    if data.ndim == 2:
+        channels = [0]
+    else:
+        channels = [channel] if channel is not None else list(range(data.shape[2]))
+    return data, mask, channels
+
+
+def _levels(dtype) -> int:
+    return int(np.iinfo(dtype).max) + 1
+
+
+def _integer_histogram(image, mask, channels, bins, min_v, max_v, clip, saturation):
+    levels = _levels(image.dtype)
+    if image.dtype not in intensities:
+        intensities[image.dtype] = np.arange(levels, dtype=np.float64)
+    # OpenCV's integer path counts every value directly where bins span the dtype's range
+    full = np.column_stack([cv2.calcHist([image], [c], mask, [levels], (0, levels)).ravel() for c in channels])
+
+    lo, hi = max(min_v, 0), min(max_v, levels)
+    span = full[lo:hi]
+    # Finer bins than values would be empty but for one in every few
+    bins = min(bins, hi - lo)
+    if bins == hi - lo:
+        counts = span
+    elif (hi - lo) % bins == 0:
+        counts = span.reshape(bins, -1, len(channels)).sum(axis=1)
+    else:
+        edges = np.ceil(np.linspace(lo, hi, bins + 1)[:-1]).astype(np.intp) - lo
+        counts = np.add.reduceat(span, edges, axis=0)
+
+    total = full.sum(axis=1, dtype=np.float64)
+    stats = _summarize(total, intensities[image.dtype], clip, levels - 1 if saturation is None else saturation)
+    return (counts[:, 0] if counts.shape[1] == 1 else counts), stats
+
+
+def _summarize(counts: np.ndarray, values: np.ndarray, clip: tuple, saturation: float) -> Statistics:
+    n = counts.sum()
+    if not n:
+        return Statistics(0, 0, 0, 0.0, 0, 0, 0.0)
+    present = np.flatnonzero(counts)
+    cumulative = np.cumsum(counts)
+    low, high = (
+        values[min(np.searchsorted(cumulative, n * p / 100, side="left"), len(values) - 1)] for p in clip
+    )
+    saturated = counts[values >= saturation].sum() / n
+    return Statistics(
+        int(n), float(values[present[0]]), float(values[present[-1]]), float(counts.dot(values) / n),
+        float(low), float(high), float(saturated)
+    )
+
+
+def _float_histogram(image, mask, channels, bins, min_v, max_v, clip, saturation):
+    samples = [image[..., c] if image.ndim == 3 else image for c in channels]
+    if mask is not None:
+        samples = [s[mask != 0] for s in samples]
+    counts = np.stack([np.histogram(s.ravel(), bins, (min_v, max_v))[0] for s in samples], axis=1)
+
+    pixels = np.concatenate([s.ravel() for s in samples])
+    if not pixels.size:
+        return counts[:, 0] if counts.shape[1] == 1 else counts, Statistics(0, 0, 0, 0.0, 0, 0, 0.0)
+    low, high = np.percentile(pixels, clip)
+    saturated = np.count_nonzero(pixels >= (1.0 if saturation is None else saturation)) / pixels.size
+    stats = Statistics(
+        pixels.size, float(pixels.min()), float(pixels.max()), float(pixels.mean(dtype=np.float64)),
+        float(low), float(high), float(saturated)
+    )
+    return (counts[:, 0] if counts.shape[1] == 1 else counts), stats
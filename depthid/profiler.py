@@ -0,0 +1,149 @@
+import json
+import logging
+from collections import deque
+from threading import Lock
+from time import time
+from weakref import WeakValueDictionary
+
+import numpy as np
+
+from depthid.pipeline.compiler import CAMERA
+from depthid.util import log_dict
+
+
+logger = logging.getLogger("depthid")
+
+
+class Profiler:
+    """Rolling timing of pipeline steps and waypoint phases, to identify which stage limits throughput.
+
+    Each step keeps its most recent durations and the bytes of newly allocated arrays it output; outputs which
+    are views, buffers lent by the pool, or buffers the step has output before, e.g. kept by the ui between
+    frames, allocate nothing. Each waypoint's time is divided into phases:
+
+        move:    waiting for the stage to arrive
+        settle:  camera steps' waits before and after capture
+        capture: waiting for the camera to deliver a frame
+        process: steps other than camera steps and saves
+        save:    job.save steps
+
+    When a filename is given, a JSON line is written per waypoint, and a summary on shutdown.
+    """
+
+    phases = ("move", "settle", "capture", "process", "save")
+    percentiles = (50, 95, 99)
+
+    def __init__(self, steps: list, camera, pool=None, window: int = 500, filename: str = None):
+        """
+        Arguments:
+            steps (list): Compiled steps.
+            camera (Camera): Camera whose capture_time divides camera steps into settle and capture.
+            pool (BufferPool): Pool whose lent buffers are not counted as allocations.
+            window (int): Number of recent samples from which statistics are computed.
+            filename (str): JSONL file to which waypoint samples and the summary are written.
+        """
+        self.steps = steps
+        self.camera = camera
+        self.pool = pool
+        self.lock = Lock()
+        self.counts = {step.idx: 0 for step in steps}
+        self.times = {step.idx: deque(maxlen=window) for step in steps}
+        self.allocated = {step.idx: deque(maxlen=window) for step in steps}
+        # Step: arrays it has output, by id, held weakly so that ids of freed arrays are not mistaken for them
+        self.outputs = {step.idx: WeakValueDictionary() for step in steps}
+        self.phase_times = {phase: deque(maxlen=window) for phase in self.phases}
+        self.waypoints = 0
+        self.fh = open(filename, "a") if filename else None
+
+    def sample(self, **phases) -> dict:
+        """Returns empty sample of a waypoint's phases and steps, with the given phase durations."""
+        return {"phases": dict(dict.fromkeys(self.phases, 0.0), **phases), "steps": {}, "bytes": {}}
+
+    def record(self, step, seconds: float, data, sample: dict = None):
+        """Records step duration and output, adding them to the waypoint's sample if given."""
+        allocated = isinstance(data, np.ndarray) and data.base is None
+        lent = allocated and self.pool is not None and self.pool.lent.get(id(data)) is data
+
+        with self.lock:
+            nbytes = 0
+            if allocated and not lent:
+                outputs = self.outputs[step.idx]
+                nbytes = 0 if outputs.get(id(data)) is data else data.nbytes
+                outputs[id(data)] = data
+            self.counts[step.idx] += 1
+            self.times[step.idx].append(seconds)
+            self.allocated[step.idx].append(nbytes)
+
+        if sample is None:
+            return
+        phases = sample["phases"]
+        if step.source == CAMERA:
+            waited = min(self.camera.capture_time, seconds)
+            phases["capture"] += waited
+            phases["settle"] += seconds - waited
+        elif step.name == "job.save":
+            phases["save"] += seconds
+        else:
+            phases["process"] += seconds
+        sample["steps"][step.idx] = seconds
+        sample["bytes"][step.idx] = nbytes
+
+    def commit(self, sample: dict, waypoint: dict = None):
+        """Records phases of a completed waypoint, writing its sample if exporting."""
+        with self.lock:
+            self.waypoints += 1
+            for phase, seconds in sample["phases"].items():
+                self.phase_times[phase].append(seconds)
+            if self.fh:
+                self.fh.write(json.dumps(dict(sample, time=time(), waypoint=waypoint)) + "\n")
+
+    def stats(self, samples) -> dict:
+        """Returns count, mean, percentiles and maximum of samples, in milliseconds."""
+        if not samples:
+            return {"count": 0}
+        ms = np.array(samples) * 1000
+        stats = {"count": len(ms), "mean": float(ms.mean())}
+        for p, value in zip(self.percentiles, np.percentile(ms, self.percentiles)):
+            stats[f"p{p}"] = float(value)
+        stats["max"] = float(ms.max())
+        return stats
+
+    def summary(self) -> dict:
+        with self.lock:
+            steps = {step.idx: (list(self.times[step.idx]), list(self.allocated[step.idx])) for step in self.steps}
+            phases = {phase: list(times) for phase, times in self.phase_times.items()}
+
+        summary = {"steps": {}, "phases": {}}
+        for step in self.steps:
+            times, allocated = steps[step.idx]
+            summary["steps"][f"{step.idx} {step.name}"] = dict(
+                self.stats(times), count=self.counts[step.idx], bytes=int(np.mean(allocated)) if allocated else 0
+            )
+        if self.waypoints:
+            summary["phases"] = {phase: self.stats(times) for phase, times in phases.items()}
+        return summary
+
+    def status(self) -> str:
+        """Returns median and 95th percentile duration of each step, for display."""
+        with self.lock:
+            times = [list(self.times[step.idx]) for step in self.steps]
+        return ", ".join(
+            "{:.1f}/{:.1f}".format(*np.percentile(t, (50, 95)) * 1000) if t else "-" for t in times
+        )
+
+    def shutdown(self):
+        summary = self.summary()
+        rows = {**summary["steps"], **summary["phases"]}
+        if rows:
+            log_dict(
+                {
+                    key: " ".join(
+                        f"{k} {v:.2f}" if isinstance(v, float) else f"{k} {v}" for k, v in stats.items()
+                    ) for key, stats in rows.items()
+                },
+                banner="Pipeline Profile (ms)"
+            )
+        if self.fh:
+            self.fh.write(json.dumps({"summary": summary, "time": time()}) + "\n")
+            self.fh.close()
+            self.fh = None
@@ -1,6 +1,7 @@
 import csv
 import re
-from operator import sub
+
+import numpy as np
 
 
 class Sequence:
@@ -21,9 +22,14 @@ class Sequence:
 
     Where x, y, and z are integers representing position on each axis. 1, 2, or 3 dimensions
     are currently permitted as input.
+
+    Waypoints may be reordered to reduce stage travel without changing which positions are visited,
+    see `reorder`.
     """
 
     axes = ('x', 'y', 'z')
+    orderings = ('serpentine', 'shortest')
+    max_passes = 50
 
     def __init__(self, waypoints: list = None):
         self.waypoints = waypoints if waypoints is not None else []
@@ -95,14 +101,155 @@ class Sequence:
         self.waypoints.append(waypoint)
         return waypoint
 
+    def to_array(self):
+        """Returns (waypoints, axes) array of positions.
+
+        Axes omitted from a waypoint hold their previous position; axes not yet positioned are NaN.
+        """
+        positions = np.full((len(self.waypoints), len(self.axes)), np.nan)
+        for idx, waypoint in enumerate(self.waypoints):
+            for axis, pos in waypoint:
+                positions[idx, self.axes.index(axis)] = pos
+
+        # Forward fill omitted axes
+        valid = ~np.isnan(positions)
+        last = np.where(valid, np.arange(len(positions))[:, None], 0)
+        np.maximum.accumulate(last, axis=0, out=last)
+        filled = positions[last, np.arange(len(self.axes))]
+        return np.where(valid.cumsum(axis=0) > 0, filled, np.nan)
+
+    @classmethod
+    def from_array(cls, positions: np.ndarray):
+        return cls(waypoints=[
+            [(axis, float(pos)) for axis, pos in zip(cls.axes, row) if not np.isnan(pos)]
+            for row in positions
+        ])
+
+    @staticmethod
+    def travel(positions: np.ndarray):
+        """Returns travel between consecutive positions, the greatest distance moved on any one axis."""
+        return np.nan_to_num(np.abs(np.diff(positions, axis=0))).max(axis=1)
+
     @property
     def distance(self):
-        origin = self.waypoints[0]
-        distance = 0
-        for waypoint in self.waypoints[1:]:
-            distance += max(map(sub, [c[1] for c in waypoint], [c[1] for c in origin]))
-            origin = waypoint
-        return distance
+        if len(self.waypoints) < 2:
+            return 0
+        return float(self.travel(self.to_array()).sum())
+
+    def reorder(self, method: str = "serpentine", fixed_axis: str = None):
+        """Returns new sequence visiting the same waypoints in an order which reduces stage travel.
+
+        Methods:
+            serpentine: For grids; reverses direction of every other row at each nesting level
+                (boustrophedon), rather than returning to the start of each row.
+            shortest: For arbitrary coordinate sets; nearest neighbour tour from the first waypoint,
+                improved by 2-opt until no reversal shortens it.
+
+        Arguments:
+            method (str): serpentine or shortest
+            fixed_axis (str): If given, waypoints sharing positions on the other axes are kept together
+                and visited along this axis, e.g. 'z' so that z-stacks are not interleaved.
+        """
+        positions = self.to_array()
+        if len(positions) < 3:
+            return Sequence.from_array(positions)
+
+        if method == "serpentine":
+            order = self.serpentine(positions, fixed_axis)
+        elif method == "shortest":
+            order = self.shortest(positions, fixed_axis)
+        else:
+            raise ValueError(f"Unknown ordering {method}, expected one of {self.orderings}")
+        return Sequence.from_array(positions[order])
+
+    def serpentine(self, positions: np.ndarray, fixed_axis: str = None):
+        # Nest axes in the order they appear, fixed axis innermost
+        levels = [self.axes.index(axis) for axis, _ in self.waypoints[0] if axis != fixed_axis]
+        levels += [idx for idx, axis in enumerate(self.axes) if idx not in levels and axis != fixed_axis]
+        if fixed_axis:
+            levels.append(self.axes.index(fixed_axis))
+        reverse = [False] * len(levels)
+
+        def snake(indices, level):
+            column = positions[indices, levels[level]]
+            keys = np.where(np.isnan(column), np.inf, column)
+            values, first = np.unique(keys, return_index=True)
+            groups = [indices[keys == v] for v in values[np.argsort(first)]]
+            if reverse[level]:
+                groups.reverse()
+            reverse[level] = not reverse[level]
+
+            for group in groups:
+                if level == len(levels) - 1:
+                    yield from group
+                else:
+                    yield from snake(group, level + 1)
+
+        return np.fromiter(snake(np.arange(len(positions)), 0), dtype=int, count=len(positions))
+
+    def shortest(self, positions: np.ndarray, fixed_axis: str = None):
+        filled = np.nan_to_num(positions)
+        if fixed_axis:
+            # Tour visits each stack as a single node, positioned on the remaining axes
+            fixed = self.axes.index(fixed_axis)
+            free = [idx for idx in range(len(self.axes)) if idx != fixed]
+            nodes, stack_ids = np.unique(filled[:, free], axis=0, return_inverse=True)
+            stack_ids = stack_ids.ravel()
+            first = stack_ids[0]
+        else:
+            nodes, stack_ids, first = filled, np.arange(len(filled)), 0
+
+        # Largest move on any axis, filled row by row rather than through an n x n x axes difference
+        dist = np.empty((len(nodes), len(nodes)))
+        for idx, node in enumerate(nodes):
+            np.abs(nodes - node).max(axis=1, out=dist[idx])
+        tour = self.two_opt(self.nearest_neighbour(dist, first), dist)
+
+        if not fixed_axis:
+            return tour
+
+        # Visit each stack along fixed axis, from whichever end is nearer the previous position
+        order = []
+        for stack in tour:
+            members = np.flatnonzero(stack_ids == stack)
+            members = members[np.argsort(filled[members, fixed], kind="stable")]
+            if order and abs(filled[members[-1], fixed] - filled[order[-1], fixed]) < \
+                    abs(filled[members[0], fixed] - filled[order[-1], fixed]):
+                members = members[::-1]
+            order.extend(members)
+        return np.array(order)
+
+    @staticmethod
+    def nearest_neighbour(dist: np.ndarray, start: int = 0):
+        visited = np.zeros(len(dist), dtype=bool)
+        tour = [start]
+        visited[start] = True
+        for _ in range(len(dist) - 1):
+            candidates = np.where(visited, np.inf, dist[tour[-1]])
+            tour.append(int(candidates.argmin()))
+            visited[tour[-1]] = True
+        return np.array(tour)
+
+    def two_opt(self, tour: np.ndarray, dist: np.ndarray):
+        """Improves open tour with fixed start by reversing segments while any reversal shortens it."""
+        n = len(tour)
+        for _ in range(self.max_passes):
+            improved = False
+            for i in range(1, n - 1):
+                a, b = tour[i - 1], tour[i]
+                c = tour[i + 1:]
+                # Reversing tour[i:j+1] replaces edges a-b and c-d with a-c and b-d; the last node has no d
+                d = np.append(tour[i + 2:], -1)
+                after = np.where(d >= 0, dist[c, np.maximum(d, 0)], 0)
+                new_after = np.where(d >= 0, dist[b, np.maximum(d, 0)], 0)
+                gain = dist[a, b] + after - dist[a, c] - new_after
+                j = int(gain.argmax())
+                if gain[j] > 1e-9:
+                    tour[i:i + j + 2] = tour[i:i + j + 2][::-1]
+                    improved = True
+            if not improved:
+                break
+        return tour
 
     def __iter__(self):
         for waypoint in self.waypoints:
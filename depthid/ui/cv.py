@@ -8,7 +8,8 @@ import numpy as np
 
 from depthid.cameras import CameraException
 from depthid.controllers import ControllerException
-from depthid.pipeline.scikit import convert_uint8_uint16
+from depthid.pipeline import stats
+from depthid.pipeline.contract import SAME, dtypes, expand_uint8
 from depthid.util import log_dict, to_csv
 
 
@@ -94,14 +95,15 @@ class UI:
     main_h = 1280
     edge_pad = 20
     asset_dir = "depthid/assets/menu_images/"
-    menu = convert_uint8_uint16(cv2.imread(f"{asset_dir}/depthid_menu.png", cv2.IMREAD_UNCHANGED))
+    # 8 bit, expanded to the window dtype when displayed
+    menu = cv2.imread(f"{asset_dir}/depthid_menu.png", cv2.IMREAD_UNCHANGED)
     menu_h, menu_w, menu_d = menu.shape
     menu_bottom = menu_h + edge_pad
     for key in keymap.values():
-        vars()[f"menu_{key}"] = convert_uint8_uint16(cv2.imread(f"{asset_dir}/depthid_menu_{key}.png", cv2.IMREAD_UNCHANGED))
+        vars()[f"menu_{key}"] = cv2.imread(f"{asset_dir}/depthid_menu_{key}.png", cv2.IMREAD_UNCHANGED)
 
-    # BGR
-    scale = 65536
+    # BGR, 8 bit
+    scale = 255
     motor_clr = np.array([0.895, 0.383, 0.00]) * scale
     camera_clr = np.array([0.894, 0.205, 0.739]) * scale
     depthid_clr = np.array([0.0, 0.136, .904]) * scale
@@ -112,12 +114,17 @@ class UI:
         self.controller = controller
         self.job = job
         self.q = Queue()
+        self.save_requests = Queue()
+        # Buffers retained between frames
+        self.enlarged = None
+        self.status_panel = None
         self.xy_step_size = self.controller.motors['x'].microstep
         self.z_step_size = self.controller.motors['z'].microstep
 
         # Generate window image and main panel border
         self.bg = np.zeros((self.win_h, self.win_w, self.win_channels), dtype=self.win_dtype)
-        cv2.rectangle(self.bg, self.panel_map['main_border'][:2], self.panel_map['main_border'][3:1:-1], self.white_clr.tolist())
+        cv2.rectangle(self.bg, self.panel_map['main_border'][:2], self.panel_map['main_border'][3:1:-1],
+                      (self.white_clr * 257).tolist())
 
         if full_screen:
             cv2.namedWindow("DepthID", cv2.WND_PROP_FULLSCREEN)
@@ -128,10 +135,19 @@ class UI:
 
         t = Thread(target=self.menu_loop)
         t.start()
+        self.camera.use_profile("preview")
 
         while self.running:
             start = time()
 
+            # Saves are captured at full resolution, then live view resumes in preview
+            try:
+                save_request = self.save_requests.get_nowait()
+            except Empty:
+                save_request = None
+            else:
+                self.camera.use_profile("capture")
+
             key = cv2.waitKeyEx(1)
             if key != -1:
                 try:
@@ -144,34 +160,61 @@ class UI:
 
             self.job.do_pipeline()
             self.refresh()
+
+            if save_request == "enter":
+                self.job.save(self.last_main, pos=self.controller.position)
+            elif save_request == "space":
+                self.job.save(self.last_bg, pos=self.controller.position)
+            if save_request:
+                self.camera.use_profile("preview")
             self.fps = 1.0 / (time() - start)
 
         t.join()
 
     def refresh(self, wait_key=False):
         cv2.imshow("DepthID", self.bg)
-        self.last_bg = self.bg.copy()
+        if self.last_bg is None:
+            self.last_bg = self.bg.copy()
+        else:
+            np.copyto(self.last_bg, self.bg)
         if wait_key:
             return cv2.waitKey(1)
 
+    @dtypes(accepts=(np.uint8, np.uint16), returns=SAME)
     def display(self, data: np.ndarray, panel: str, l_offset: int = 0, t_offset: int = 0):
         min_h, min_w, max_h, max_w = self.panel_map[panel]
         image_h, image_w, image_d = data.shape
-        self.bg[
+        # Enlarge reduced resolution preview to fill the panel
+        factor = min(self.main_w // image_w, self.main_h // image_h) if panel == "main" else 1
+        if factor > 1:
+            # Enlarged into a buffer retained between frames
+            shape = (image_h * factor, image_w * factor, image_d)
+            if self.enlarged is None or self.enlarged.shape != shape or self.enlarged.dtype != data.dtype:
+                self.enlarged = np.empty(shape, dtype=data.dtype)
+            data = cv2.resize(data, shape[1::-1], dst=self.enlarged, interpolation=cv2.INTER_NEAREST)
+            image_h, image_w, image_d = data.shape
+        region = self.bg[
             min_h + t_offset:min_h + t_offset + image_h,
             min_w + l_offset:min_w + l_offset + image_w,
             :
-        ] = data
+        ]
+        # 8 bit images are scaled to the full 16 bit range by lookup table, without float arithmetic
+        if data.dtype == np.uint8:
+            expand_uint8(data, out=region)
+        else:
+            region[...] = data
         if panel == "main":
             self.last_main = data
         return data
 
+    @dtypes(returns=np.uint8)
     def display_menu(self, panel: str = "status"):
         data = getattr(self, f"menu_{self.last_key}", self.menu)
         self.display(data, panel, l_offset=75, t_offset=25)
         self.last_key = None
         return data
 
+    @dtypes(returns=np.uint8)
     def display_status(self, panel: str = "status"):
         panel_w = self.main_w
         panel_h = 110
@@ -189,7 +232,7 @@ class UI:
                 f"Position: {', '.join([str(p) for p in self.controller.position.values()])} "
             )
         else:
-            depthid = f"FPS: {self.fps:.2f} PipelineT: {self.job.pipeline_t}"
+            depthid = f"FPS: {self.fps:.2f} Step p50/p95 ms: {self.job.profiler.status()}"
             camera = (
                 "Exposure: {ExposureTime:.6f} us ({ExposureTime%:.2%}) "
                 "Gain: {Gain:.6f} dB ({Gain%:.2%}) "
@@ -203,8 +246,15 @@ class UI:
                 f"Microstep: {', '.join([str(m.microstep) for m in self.controller.motors.values()])}"
             )
         directory = f"Directory: {self.job.session_directory}"
-
-        data = np.zeros((panel_h, panel_w, self.win_channels))
+        if self.job.writer:
+            directory += f" Writer: {self.job.writer.status()}"
+        if self.job.histogram_name in stats.latest:
+            directory += f" Intensity: {stats.latest[self.job.histogram_name]}"
+
+        if self.status_panel is None or self.status_panel.shape != (panel_h, panel_w, self.win_channels):
+            self.status_panel = np.zeros((panel_h, panel_w, self.win_channels), dtype=np.uint8)
+        data = self.status_panel
+        data.fill(0)
         cv2.putText(data, motor, (0, 25), *font, self.motor_clr.tolist(), 1)
         cv2.putText(data, camera, (0, 50), *font, self.camera_clr.tolist(), 1)
         cv2.putText(data, depthid, (0, 75), *font, self.depthid_clr.tolist(), 1)
@@ -291,10 +341,9 @@ class UI:
             log_dict(self.camera.settings, banner="Camera Settings")
         elif key == "f":
             log_dict(self.camera.features, banner="Camera Features")
-        elif key == "enter":
-            self.job.save(self.last_main, self.controller.position)
-        elif key == "space":
-            self.job.save(self.last_bg, self.controller.position)
+        elif key in ("enter", "space"):
+            # Saved by the display loop, which owns the camera
+            self.save_requests.put(key)
 
         # Other control
         if key == "p":
@@ -0,0 +1,151 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+from threading import BoundedSemaphore, Lock
+from time import time
+
+from depthid.util import log_dict
+
+
+logger = logging.getLogger("depthid")
+
+
+class Writer:
+    """Encodes and writes saved images on worker threads, so that acquisition does not wait on disk.
+
+    Each file, i.e. each format of a saved image, is written by its own task from the same image, so formats
+    are encoded concurrently. At most queue_size files await writing; beyond that, queuing a file waits for
+    one to complete, slowing acquisition only while the disk falls behind.
+    """
+
+    def __init__(self, workers: int = 2, queue_size: int = 8):
+        """
+        Arguments:
+            workers (int): Threads encoding and writing files.
+            queue_size (int): Files queued or being written, beyond which queuing waits.
+        """
+        self.workers = workers
+        self.queue_size = queue_size
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="writer")
+        self.slots = BoundedSemaphore(queue_size)
+        self.lock = Lock()
+        self.pending = set()
+        self.error = None
+        self.failed = 0
+        self.start_time = time()
+        self.written = 0
+        self.bytes = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+        self.max_depth = 0
+
+    def write(self, data, saves: list, done=None):
+        """Queues data to be saved to each file, waiting while the queue is full.
+
+        Arguments:
+            data: Image, which must remain valid until done is called, e.g. a copy or retained frame.
+            saves (list): Pairs of callable and filename, one per format. The callable is called with data and
+                the filename, writing the file. Where it returns the number of bytes written, e.g. appending to
+                a container, that is counted rather than the file's size.
+            done (callable): Called once every file has been written or has failed.
+
+        Raises:
+            The exception of a previously failed write, so that lost saves stop the job.
+        """
+        self.raise_error()
+        remaining = [len(saves)]
+
+        def finished(future):
+            with self.lock:
+                self.pending.discard(future)
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            self.slots.release()
+            if last and done is not None:
+                done()
+
+        for save, filename in saves:
+            start = time()
+            self.slots.acquire()
+            with self.lock:
+                self.blocked += time() - start
+                self.max_depth = max(self.max_depth, len(self.pending) + 1)
+                future = self.executor.submit(self.encode, save, data, filename)
+                self.pending.add(future)
+            future.add_done_callback(finished)
+
+    def encode(self, save, data, filename: str):
+        start = time()
+        try:
+            written = save(data, filename)
+            size = written if type(written) is int else os.path.getsize(filename)
+        except Exception as e:
+            logger.error(f"Unable to save {filename}: {e}")
+            with self.lock:
+                self.error = self.error or e
+                self.failed += 1
+            return
+        with self.lock:
+            self.written += 1
+            self.bytes += size
+            self.busy += time() - start
+        logger.info(f"Saved {filename}")
+
+    def raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def flush(self):
+        """Waits for every queued file to be written.
+
+        Raises:
+            The exception of a failed write.
+        """
+        with self.lock:
+            pending = list(self.pending)
+        wait(pending)
+        self.raise_error()
+
+    @property
+    def stats(self) -> dict:
+        with self.lock:
+            elapsed = time() - self.start_time
+            return {
+                "depth": len(self.pending),
+                "max_depth": self.max_depth,
+                "written": self.written,
+                "failed": self.failed,
+                "bytes": self.bytes,
+                # Rate over the session, and of each worker while writing
+                "throughput": self.bytes / elapsed if elapsed else 0.0,
+                "write_rate": self.bytes / self.busy if self.busy else 0.0,
+                "blocked": self.blocked
+            }
+
+    def status(self) -> str:
+        """Returns queue depth and write throughput, for display."""
+        stats = self.stats
+        return f"{stats['depth']}/{self.queue_size} queued, {stats['throughput'] / 2 ** 20:.1f} MiB/s"
+
+    def shutdown(self):
+        """Writes queued files and stops workers, logging queue depth and throughput.
+
+        Raises:
+            The exception of a failed write not yet raised, so that lost saves are not silent.
+        """
+        self.executor.shutdown()
+        stats = self.stats
+        log_dict(
+            {
+                "Files": stats["written"],
+                "Failed": stats["failed"],
+                "Written": f"{stats['bytes'] / 2 ** 20:.1f} MiB",
+                "Throughput": f"{stats['throughput'] / 2 ** 20:.1f} MiB/s",
+                "Write rate": f"{stats['write_rate'] / 2 ** 20:.1f} MiB/s per worker",
+                "Max queued": f"{stats['max_depth']}/{self.queue_size}",
+                "Acquisition waited": f"{stats['blocked']:.3f} s"
+            },
+            banner="Writer"
+        )
+        self.raise_error()
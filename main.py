@@ -31,7 +31,11 @@ def main(config_fh: TextIO):
     except KeyboardInterrupt:
         logger.info("Job cancelled due to keyboard interrupt")
     finally:
-        job.shutdown()
+        try:
+            job.shutdown()
+        except JobException as e:
+            logger.error(e)
+            exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,49 @@
+from time import sleep, time
+
+from depthid.cameras import Synthetic
+from depthid.pipeline.spinnaker import capture
+
+
+def synthetic(**kwargs):
+    camera = Synthetic(0, 32, 32, 1000.0, 0.0, "Mono16", threaded=True, queue_size=4, frame_rate=100.0, **kwargs)
+    camera.initialize()
+    return camera
+
+
+def test_threaded_capture_is_not_older_than_arrival():
+    camera = synthetic()
+    try:
+        for _ in range(3):
+            # Frames queue while the stage moves
+            sleep(.1)
+            camera.arrival = time()
+            capture(camera, wait_before=0.0, wait_after=0.0, policy="every")
+            assert camera.timestamp >= camera.arrival
+    finally:
+        camera.stop_acquisition()
+
+
+def test_threaded_newest_capture_is_not_older_than_arrival():
+    camera = synthetic()
+    try:
+        sleep(.1)
+        camera.arrival = time()
+        capture(camera, wait_before=0.0, wait_after=0.0, policy="newest")
+        assert camera.timestamp >= camera.arrival
+    finally:
+        camera.stop_acquisition()
+
+
+def test_threaded_every_capture_returns_queued_frames_in_turn():
+    camera = synthetic()
+    try:
+        # Frames queue while the previous frame is processed
+        sleep(.1)
+        seqs = []
+        for _ in range(6):
+            capture(camera, wait_before=0.0, wait_after=0.0, policy="every")
+            seqs.append(camera.seq)
+        assert seqs == list(range(1, 7))
+        assert camera.skipped == 0
+    finally:
+        camera.stop_acquisition()
@@ -0,0 +1,66 @@
+import os
+
+import numpy as np
+import pytest
+
+from depthid.container import ContainerReader, ContainerWriter, trailer
+
+
+def frames(n: int = 4):
+    return [np.full((24, 32), idx, dtype=np.uint16) for idx in range(n)]
+
+
+def write(path: str, data: list):
+    writer = ContainerWriter(path)
+    for idx, frame in enumerate(data):
+        writer.append(frame, {"x": f"{idx:.3f}", "z": "1.500"}, timestamp=float(idx))
+    return writer
+
+
+def truncate(path: str, nbytes: int):
+    with open(path, "r+b") as fh:
+        fh.truncate(os.path.getsize(path) - nbytes)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "session.dids")
+
+
+def test_round_trip(path):
+    data = frames()
+    write(path, data).close()
+    with ContainerReader(path) as reader:
+        assert len(reader) == len(data)
+        for frame, expected in zip(reader, data):
+            np.testing.assert_array_equal(frame, expected)
+        assert reader.lookup(x=2, z=1.5) == [2]
+        assert reader.metadata(3)["waypoint"] == {"x": 3.0, "z": 1.5}
+
+
+def test_recovers_index_without_trailer(path):
+    data = frames()
+    write(path, data).close()
+    truncate(path, trailer.itemsize)
+    with ContainerReader(path) as reader:
+        assert len(reader) == len(data)
+        np.testing.assert_array_equal(reader[3], data[3])
+
+    # Reopening appends after the recovered frames
+    writer = ContainerWriter(path)
+    writer.append(data[0])
+    writer.close()
+    with ContainerReader(path) as reader:
+        assert len(reader) == len(data) + 1
+
+
+def test_recovers_frames_before_cut_off_frame(path):
+    data = frames()
+    # Killed while writing the final frame
+    writer = write(path, data)
+    writer.fh.close()
+    truncate(path, data[-1].nbytes // 2)
+    with ContainerReader(path) as reader:
+        assert len(reader) == len(data) - 1
+        for frame, expected in zip(reader, data):
+            np.testing.assert_array_equal(frame, expected)
@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from depthid import pipeline as p
+from depthid.pipeline.compiler import CAMERA, compile_pipeline
+from depthid.pipeline.contract import SAME, dtypes
+
+
+@dtypes(returns=np.float32)
+def floats(data):
+    return data.astype(np.float32)
+
+
+@dtypes(accepts=(np.uint8, np.uint16), returns=SAME)
+def invert(data):
+    return ~data
+
+
+@dtypes(returns=np.uint16)
+def wrong(data):
+    return data.astype(np.float32)
+
+
+steps = SimpleNamespace(floats=floats, invert=invert, wrong=wrong, source=lambda camera: camera)
+modules = dict(p=steps, opencv=p.opencv, spinnaker=p.spinnaker)
+
+
+def run(pipeline: list, camera) -> list:
+    stack = [None] * len(pipeline)
+    for step in compile_pipeline(pipeline, modules, camera):
+        step.run(stack)
+    return stack
+
+
+def test_conflicting_source_rejected_at_compile_time():
+    with pytest.raises(ValueError, match="Step 1 p.invert: accepts uint8 or uint16, but step 0 returns float32"):
+        compile_pipeline([
+            {"m": "p", "f": "floats", "i": CAMERA},
+            {"m": "p", "f": "invert", "i": 0}
+        ], modules, camera=None)
+
+
+def test_same_follows_its_source_when_compiled():
+    with pytest.raises(ValueError, match="Step 2 spinnaker.save: accepts frame, but step 1 returns uint8 or uint16"):
+        compile_pipeline([
+            {"m": "spinnaker", "f": "transform_ndarray", "i": CAMERA},
+            {"m": "opencv", "f": "gray_to_rgb", "i": 0},
+            {"m": "spinnaker", "f": "save", "i": 1, "kw": {"filename": "frame.png"}}
+        ], modules, camera=None)
+
+
+def test_frames_only_taken_by_frame_steps():
+    with pytest.raises(ValueError, match="accepts frame, but step 0 returns float32"):
+        compile_pipeline([
+            {"m": "p", "f": "floats", "i": CAMERA},
+            {"m": "spinnaker", "f": "save", "i": 0, "kw": {"filename": "frame.png"}}
+        ], modules, camera=None)
+
+
+def test_undeclared_input_checked_as_step_runs():
+    with pytest.raises(TypeError, match="Step 1 p.invert: input is float32, expected uint8 or uint16"):
+        run([
+            {"m": "p", "f": "source", "i": CAMERA},
+            {"m": "p", "f": "invert", "i": 0}
+        ], camera=np.zeros((2, 2), np.float32))
+
+
+def test_output_checked_as_step_runs():
+    with pytest.raises(TypeError, match="Step 0 p.wrong: returned float32, declared uint16"):
+        run([{"m": "p", "f": "wrong", "i": CAMERA}], camera=np.zeros((2, 2), np.uint16))
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16])
+def test_same_returns_input_dtype(dtype):
+    stack = run([
+        {"m": "p", "f": "source", "i": CAMERA},
+        {"m": "p", "f": "invert", "i": 0},
+        {"m": "opencv", "f": "gray_to_rgb", "i": 1}
+    ], camera=np.zeros((2, 2), dtype))
+    assert stack[1].dtype == dtype
+    assert stack[2].dtype == dtype and stack[2].shape == (2, 2, 3)
@@ -0,0 +1,46 @@
+from depthid.controllers import Grbl, Marlin
+from depthid.controllers.simulator import Simulator
+
+
+motors = [("x", .5), ("y", .5), ("z", .5)]
+# Fast moves keep the tests short
+settings = {110: 8000.0, 111: 8000.0, 112: 8000.0, 120: 1000.0, 121: 1000.0, 122: 1000.0}
+
+
+def test_marlin_parses_m114_position():
+    assert Marlin.pos_pattern.search("X:10.00 Y:-2.50 Z:0.00 E:0.00 Count X:800 Y:-200 Z:0").groupdict() == {
+        "x": "10.00", "y": "-2.50", "z": "0.00"
+    }
+
+
+def test_marlin_moves_on_simulator():
+    with Simulator(settings=settings, banner="Marlin") as simulator:
+        controller = Marlin(simulator.device_name, 115200, motors)
+        controller.initialize()
+        try:
+            controller.move({"x": "1.000", "z": "0.500"})
+            assert controller.update_position() == {"x": "1.000", "y": "0.000", "z": "0.500"}
+        finally:
+            controller.shutdown()
+
+
+def test_grbl_moves_on_simulator():
+    with Simulator(settings=settings) as simulator:
+        controller = Grbl(simulator.device_name, 115200, motors)
+        controller.initialize()
+        try:
+            controller.move({"x": "1.000", "z": "0.500"})
+            assert controller.update_position() == {"x": "1.000", "y": "0.000", "z": "0.500"}
+        finally:
+            controller.shutdown()
+
+
+def test_marlin_jogs_on_simulator():
+    with Simulator(settings=settings, banner="Marlin") as simulator:
+        controller = Marlin(simulator.device_name, 115200, motors)
+        controller.initialize()
+        try:
+            controller.jog("y", 2)
+            assert controller.update_position()["y"] == "1.000"
+        finally:
+            controller.shutdown()
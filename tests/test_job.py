@@ -0,0 +1,55 @@
+import json
+import os
+from threading import Event
+
+import numpy as np
+
+from depthid.cameras import Synthetic, SyntheticImage
+from depthid.cameras.packing import pack
+from depthid.container import CONTAINER, ContainerReader
+from depthid.controllers import Grbl
+from depthid.job import Job
+from depthid.writer import Writer
+
+
+def job(tmp_path, **kwargs):
+    camera = Synthetic(0, 16, 16, 1000.0, 0.0, "Mono16")
+    controller = Grbl("unconnected", 115200, [("x", .5), ("y", .5), ("z", .5)])
+    job = Job("test", str(tmp_path), controller=controller, camera=camera, pipeline={}, parameters="",
+              mode="interactive", full_screen=False, **kwargs)
+    os.makedirs(job.session_directory)
+    job.writer = Writer(workers=1)
+    return job
+
+
+def test_container_saves_position_when_queued(tmp_path):
+    session = job(tmp_path, save_formats=[CONTAINER])
+
+    # Hold the worker, so that the frame is written after the position has changed
+    release = Event()
+    session.writer.write(None, [(lambda data, fn: release.wait() and 0, "blocker")])
+    position = {"x": "1.000", "z": "2.000"}
+    session.save(np.zeros((16, 16), dtype=np.uint16), pos=position)
+    position.update(x="5.000", z="6.000")
+    release.set()
+    session.writer.flush()
+    session.container.close()
+
+    with ContainerReader(session.container.path) as reader:
+        assert reader.metadata(0)["waypoint"] == {"x": 1.0, "z": 2.0}
+
+
+def test_statistics_of_packed_frame(tmp_path):
+    session = job(tmp_path, save_formats=[CONTAINER])
+    session.statistics_fh = open(f"{session.session_directory}/statistics.jsonl", "a")
+    pixels = np.arange(16 * 16, dtype=np.uint16).reshape(16, 16) * 16
+    image = SyntheticImage(pack(pixels, "Mono12p"), 0, 0.0, "Mono12p", shape=pixels.shape)
+    session.save(image, pos={"z": "1.000"})
+    session.writer.flush()
+    session.statistics_fh.close()
+
+    with open(session.statistics_fh.name) as fh:
+        line = json.loads(fh.readline())
+    assert (line["min"], line["max"], line["count"]) == (0, pixels.max(), pixels.size)
+    assert line["waypoint"] == {"z": "1.000"}
+    assert line["files"] == [f"session.{CONTAINER}"]
@@ -0,0 +1,99 @@
+from types import SimpleNamespace
+
+import pytest
+
+from depthid import pipeline as p
+from depthid.pipeline.compiler import CAMERA, active, compile_pipeline
+from depthid.pipeline.macro import INPUT, expand
+
+
+ui = SimpleNamespace(display=lambda data, panel: None, display_status=lambda: None)
+modules = dict({name: getattr(p, name) for name in p.__all__}, ui=ui)
+
+
+def compile(pipeline: list, library: dict = None) -> list:
+    return compile_pipeline(expand(pipeline, library), modules, camera=None)
+
+
+def test_inputs_after_macro_refer_to_its_output():
+    steps = expand([
+        {"macro": "capture_and_save"},
+        {"m": "opencv", "f": "gray_to_rgb", "i": 0}
+    ])
+    assert [(s["f"], s.get("i")) for s in steps] == [
+        ("capture", CAMERA), ("transform_ndarray", 0), ("save", 0), ("gray_to_rgb", 1)
+    ]
+    assert steps[3]["origin"] == "step 1"
+    assert steps[2]["origin"] == "step 0, macro capture_and_save step 2"
+
+
+def test_nested_macros_substitute_parameters():
+    steps = expand([
+        {"macro": "capture"},
+        {"macro": "live_preview", "i": 0, "kw": {"bins": 256, "log": "2", "histogram_panel": "sub2"}}
+    ])
+    by_f = {(s["m"], s["f"], s.get("kw", {}).get("panel")): s for s in steps}
+    histogram = by_f[("stats", "histogram", None)]
+    plot = by_f[("opencv", "plot_histogram", None)]
+    assert histogram["kw"] == {"bins": 256, "stride": 1}
+    assert histogram["i"] == 1
+    assert plot["kw"] == {"log": "2"}
+    assert plot["i"] == steps.index(histogram)
+    assert by_f[("ui", "display", "sub2")]["i"] == steps.index(plot)
+    assert by_f[("ui", "display", "main")]["i"] == steps.index(by_f[("opencv", "gray_to_rgb", None)])
+    assert plot["origin"] == "step 1, macro live_preview step 1, macro histogram_plot step 1"
+    assert histogram["lazy"] and plot["lazy"]
+
+
+def test_every_multiplies_through_macros():
+    library = {
+        "inner": {"steps": [{"m": "opencv", "f": "gray_to_rgb", "i": INPUT}], "every": 2},
+        "outer": {"steps": [{"macro": "inner", "i": INPUT}]}
+    }
+    steps = expand([{"macro": "capture"}, {"macro": "outer", "i": 0, "every": 3}], library)
+    assert [s["every"] for s in steps] == [1, 1, 6]
+
+
+def test_lazy_steps_run_only_where_consumed():
+    steps = compile([
+        {"macro": "capture"},
+        {"macro": "histogram_plot", "i": 0},
+        {"m": "ui", "f": "display", "i": 1, "kw": {"panel": "sub1"}, "every": 2},
+        {"m": "ui", "f": "display", "i": 0, "kw": {"panel": "main"}}
+    ])
+    assert [s.name for s in steps] == [
+        "spinnaker.capture", "spinnaker.transform_ndarray", "stats.histogram", "opencv.plot_histogram",
+        "ui.display", "ui.display"
+    ]
+    assert active(steps, 0) == [True] * 6
+    assert active(steps, 1) == [True, True, False, False, False, True]
+
+
+def test_unconsumed_lazy_chain_never_runs():
+    steps = compile([{"macro": "capture"}, {"macro": "histogram_plot", "i": 0}])
+    assert active(steps, 0) == [True, True, False, False]
+
+
+@pytest.mark.parametrize("pipeline, library, message", [
+    ([{"macro": "missing"}], None, "unknown macro missing"),
+    ([{"macro": "loop"}], {"loop": {"steps": [{"macro": "loop"}]}}, "macro loop includes itself"),
+    ([{"m": "opencv", "f": "gray_to_rgb", "i": INPUT}], None, "only valid within macros"),
+    ([{"macro": "capture", "kw": {"bins": 4}}], None, "unknown parameters bins"),
+    ([{"macro": "capture"}, {"m": "opencv", "f": "gray_to_rgb", "i": 2}], None, "must be an earlier step"),
+])
+def test_expand_errors(pipeline, library, message):
+    with pytest.raises(ValueError, match=message):
+        expand(pipeline, library)
+
+
+@pytest.mark.parametrize("setting", [{"every": 2}, {"lazy": True}])
+def test_camera_steps_run_every_frame(setting):
+    with pytest.raises(ValueError, match=r"\(step 0, macro capture_and_save step 0\).*cannot be 'every' or 'lazy'"):
+        compile([dict({"macro": "capture_and_save"}, **setting)])
+
+
+def test_compile_errors_locate_written_step():
+    with pytest.raises(ValueError, match=r"Step 3 opencv.missing \(step 2\): unknown function"):
+        compile([
+            {"macro": "capture"}, {"m": "opencv", "f": "gray_to_rgb", "i": 0}, {"m": "opencv", "f": "missing", "i": 0}
+        ])
@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+
+from depthid.pipeline import opencv
+
+
+@pytest.mark.parametrize("log", ["e", "2", "10", None])
+def test_plot_histogram(log):
+    counts = np.arange(256, dtype=np.float32)
+    plot = opencv.plot_histogram(counts, log=log, name=f"test {log}", width=320, height=240)
+    assert plot.dtype == np.uint16 and plot.shape == (240, 320, 3)
+    assert plot.any()
+
+
+@pytest.mark.parametrize("log", ["log", 10, ""])
+def test_plot_histogram_rejects_unknown_log(log):
+    with pytest.raises(ValueError, match="Unknown log"):
+        opencv.plot_histogram(np.ones(16, dtype=np.float32), log=log, name="test unknown")
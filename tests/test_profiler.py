@@ -0,0 +1,24 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from depthid.profiler import Profiler
+
+
+def test_kept_buffers_are_counted_once():
+    step = SimpleNamespace(idx=0, name="ui.display", source=None)
+    profiler = Profiler([step], camera=None)
+    kept = np.zeros((120, 160, 3), dtype=np.uint16)
+    for _ in range(4):
+        profiler.record(step, .001, kept)
+    assert list(profiler.allocated[0]) == [kept.nbytes, 0, 0, 0]
+
+
+def test_new_arrays_and_views():
+    step = SimpleNamespace(idx=0, name="numpy.copy", source=None)
+    profiler = Profiler([step], camera=None)
+    for _ in range(3):
+        profiler.record(step, .001, np.zeros((10, 10), dtype=np.uint16))
+    source = np.zeros((10, 10), dtype=np.uint16)
+    profiler.record(step, .001, source[::2])
+    assert list(profiler.allocated[0]) == [200, 200, 200, 0]
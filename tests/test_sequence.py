@@ -0,0 +1,24 @@
+import numpy as np
+
+from depthid.sequence import Sequence
+
+
+def travel(positions: np.ndarray) -> float:
+    return float(np.abs(np.diff(positions, axis=0)).max(axis=1).sum())
+
+
+def test_shortest_visits_each_waypoint_once_with_less_travel():
+    positions = np.random.default_rng(0).uniform(0, 100, (200, 3))
+    tour = Sequence.from_array(positions).reorder("shortest").to_array()
+    assert np.array_equal(tour[0], positions[0])
+    assert sorted(map(tuple, tour)) == sorted(map(tuple, positions))
+    assert travel(tour) < travel(positions) / 2
+
+
+def test_shortest_keeps_stacks_together():
+    xy = np.random.default_rng(1).uniform(0, 100, (30, 2))
+    positions = np.array([(x, y, z) for z in range(4) for x, y in xy], dtype=float)
+    tour = Sequence.from_array(positions).reorder("shortest", fixed_axis="z").to_array()
+    stacks = tour.reshape(30, 4, 3)
+    assert (stacks[:, :, :2] == stacks[:, :1, :2]).all()
+    assert all(sorted(stack[:, 2]) == [0, 1, 2, 3] for stack in stacks)
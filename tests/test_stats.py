@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from depthid.pipeline import stats
+
+
+@pytest.fixture
+def rng():
+    return np.random.RandomState(0)
+
+
+@pytest.mark.parametrize("bins", [64, 100, 256, 1024])
+def test_uint8_histogram_matches_numpy(rng, bins):
+    data = rng.randint(0, 256, (48, 64)).astype(np.uint8)
+    counts = stats.histogram(data, bins=bins)
+    expected = np.histogram(data, min(bins, 256), (0, 256))[0]
+    assert counts.dtype == np.float32
+    np.testing.assert_array_equal(counts, expected)
+
+
+def test_uint8_histogram_channels_and_stride(rng):
+    data = rng.randint(0, 256, (48, 64, 3)).astype(np.uint8)
+    counts = stats.histogram(data, bins=1024, stride=2)
+    assert counts.shape == (256, 3)
+    for c in range(3):
+        np.testing.assert_array_equal(counts[:, c], np.bincount(data[::2, ::2, c].ravel(), minlength=256))
+
+
+def test_uint8_statistics(rng):
+    data = rng.randint(0, 256, (48, 64)).astype(np.uint8)
+    data[0, :8] = 255
+    stats.histogram(data, bins=1024, name="test")
+    summary = stats.latest["test"]
+    assert summary.count == data.size
+    assert (summary.min, summary.max) == (data.min(), data.max())
+    assert summary.mean == pytest.approx(data.mean())
+    assert summary.saturated == pytest.approx(np.count_nonzero(data == 255) / data.size)
+
+
+@pytest.mark.parametrize("bins", [1024, 1000])
+def test_uint16_histogram_matches_numpy(rng, bins):
+    data = rng.randint(0, 65536, (48, 64)).astype(np.uint16)
+    np.testing.assert_array_equal(stats.histogram(data, bins=bins), np.histogram(data, bins, (0, 65536))[0])
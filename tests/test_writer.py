@@ -0,0 +1,23 @@
+import pytest
+
+from depthid.writer import Writer
+
+
+def fail(data, filename):
+    raise OSError(f"No space left on device: {filename}")
+
+
+def test_shutdown_raises_failed_write():
+    writer = Writer(workers=1)
+    writer.write(None, [(fail, "0.tiff"), (lambda data, fn: 10, "1.tiff")])
+    with pytest.raises(OSError, match="0.tiff"):
+        writer.shutdown()
+    assert (writer.stats["written"], writer.stats["failed"]) == (1, 1)
+
+
+def test_shutdown_after_writes():
+    writer = Writer(workers=2)
+    for idx in range(4):
+        writer.write(None, [(lambda data, fn: 10, f"{idx}.tiff")])
+    writer.shutdown()
+    assert writer.stats["bytes"] == 40